@@ -25,16 +25,107 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# Channel ingest
+app.config["CHANNEL_INSERT_CHUNK_SIZE"] = int(os.environ.get("CHANNEL_INSERT_CHUNK_SIZE", "2000"))
+app.config["CATEGORY_RULES_FILE"] = os.environ.get("CATEGORY_RULES_FILE")
+
+# Playlist download cache. Bodies are kept on disk with their ETag /
+# Last-Modified so an unchanged playlist is answered with a 304.
+# PLAYLIST_CACHE_MAX_BYTES=0 disables it.
+app.config["PLAYLIST_CACHE_DIR"] = os.environ.get(
+    "PLAYLIST_CACHE_DIR", os.path.join(app.instance_path, "playlist_cache")
+)
+app.config["PLAYLIST_CACHE_MAX_BYTES"] = int(os.environ.get("PLAYLIST_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Playlists are streamed and parsed incrementally; larger downloads are aborted
+app.config["PLAYLIST_MAX_BYTES"] = int(os.environ.get("PLAYLIST_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Playlist export
+app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+# Gzip+base64 the playlist embedded in offline HTML downloads. The page then
+# needs DecompressionStream, which some older TV browsers lack.
+app.config["OFFLINE_HTML_COMPRESS"] = os.environ.get("OFFLINE_HTML_COMPRESS", "0") == "1"
+
+# M3U viewer uploads (and their cached offline pages) are deleted once the
+# same file hasn't been imported for VIEWER_RETENTION_DAYS; 0 keeps them.
+# The demo playlist is never deleted.
+app.config["VIEWER_RETENTION_DAYS"] = float(os.environ.get("VIEWER_RETENTION_DAYS", "7"))
+app.config["VIEWER_CLEANUP_INTERVAL"] = float(os.environ.get("VIEWER_CLEANUP_INTERVAL", "3600"))
+
+# Channel probing
+# "basic" (HEAD/GET status) or "hls" (fetch the first media segment of .m3u8 streams)
+app.config["PROBE_MODE"] = os.environ.get("PROBE_MODE", "basic")
+app.config["PROBE_CONCURRENCY"] = int(os.environ.get("PROBE_CONCURRENCY", "100"))
+app.config["PROBE_BATCH_SIZE"] = int(os.environ.get("PROBE_BATCH_SIZE", "500"))
+app.config["PROBE_PER_HOST_CONCURRENCY"] = int(os.environ.get("PROBE_PER_HOST_CONCURRENCY", "4"))
+app.config["PROBE_PER_HOST_INTERVAL"] = float(os.environ.get("PROBE_PER_HOST_INTERVAL", "0.25"))
+app.config["PROBE_CACHE_TTL"] = float(os.environ.get("PROBE_CACHE_TTL", "1800"))
+app.config["PROBE_CACHE_SIZE"] = int(os.environ.get("PROBE_CACHE_SIZE", "200000"))
+
+# Incremental re-validation: a periodic job re-tests channels whose last
+# check is older than REVALIDATE_AFTER_HOURS, flaky and often-exported
+# channels first, for at most REVALIDATE_CYCLE_BUDGET seconds per cycle.
+app.config["REVALIDATE_ENABLED"] = os.environ.get("REVALIDATE_ENABLED", "1") == "1"
+app.config["REVALIDATE_INTERVAL"] = float(os.environ.get("REVALIDATE_INTERVAL", "900"))
+app.config["REVALIDATE_AFTER_HOURS"] = float(os.environ.get("REVALIDATE_AFTER_HOURS", "24"))
+app.config["REVALIDATE_CYCLE_BUDGET"] = float(os.environ.get("REVALIDATE_CYCLE_BUDGET", "300"))
+app.config["REVALIDATE_BATCH_SIZE"] = int(os.environ.get("REVALIDATE_BATCH_SIZE", "2000"))
+app.config["REVALIDATE_FLAKINESS_WEIGHT"] = float(os.environ.get("REVALIDATE_FLAKINESS_WEIGHT", "5"))
+app.config["REVALIDATE_EXPORT_WEIGHT"] = float(os.environ.get("REVALIDATE_EXPORT_WEIGHT", "2"))
+
+# Crawling: a search URL that isn't a playlist is treated as a page whose
+# playlist links are downloaded in parallel and ingested into the same search
+app.config["CRAWL_ENABLED"] = os.environ.get("CRAWL_ENABLED", "1") == "1"
+# Hops from the search page; linked pages are searched for more playlists
+# while they are within this depth
+app.config["CRAWL_MAX_DEPTH"] = int(os.environ.get("CRAWL_MAX_DEPTH", "2"))
+app.config["CRAWL_MAX_WORKERS"] = int(os.environ.get("CRAWL_MAX_WORKERS", "8"))
+app.config["CRAWL_MAX_LINKS"] = int(os.environ.get("CRAWL_MAX_LINKS", "200"))
+# Per-host politeness for crawl downloads, as for channel probes
+app.config["CRAWL_PER_HOST_CONCURRENCY"] = int(os.environ.get("CRAWL_PER_HOST_CONCURRENCY", "2"))
+app.config["CRAWL_PER_HOST_INTERVAL"] = float(os.environ.get("CRAWL_PER_HOST_INTERVAL", "0.25"))
+
+# Outgoing HTTP: one client per process shares keep-alive connection pools,
+# cached DNS lookups and the retry/timeout policy across every job.
+# HTTP_POOL_CONNECTIONS is how many hosts keep a pool, HTTP_POOL_MAXSIZE how
+# many idle connections each host keeps; see /api/http/stats when tuning.
+app.config["HTTP_POOL_CONNECTIONS"] = int(os.environ.get("HTTP_POOL_CONNECTIONS", "100"))
+app.config["HTTP_POOL_MAXSIZE"] = int(os.environ.get("HTTP_POOL_MAXSIZE", "16"))
+# Retries apply to connection errors and 502/503/504, for GET and HEAD only
+app.config["HTTP_RETRIES"] = int(os.environ.get("HTTP_RETRIES", "1"))
+app.config["HTTP_RETRY_BACKOFF"] = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.3"))
+app.config["HTTP_CONNECT_TIMEOUT"] = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+# Read timeout for pages and playlists, and the shorter one for stream probes
+app.config["HTTP_READ_TIMEOUT"] = float(os.environ.get("HTTP_READ_TIMEOUT", "10"))
+app.config["HTTP_PROBE_TIMEOUT"] = float(os.environ.get("HTTP_PROBE_TIMEOUT", "5"))
+# Seconds a resolved host address is reused; 0 disables the DNS cache
+app.config["HTTP_DNS_CACHE_TTL"] = float(os.environ.get("HTTP_DNS_CACHE_TTL", "300"))
+
+# Background jobs. With JOB_WORKER_EMBEDDED the web process also runs a
+# worker thread; set it to 0 when running `python worker.py` separately.
+app.config["JOB_WORKER_EMBEDDED"] = os.environ.get("JOB_WORKER_EMBEDDED", "1") == "1"
+app.config["JOB_POLL_INTERVAL"] = float(os.environ.get("JOB_POLL_INTERVAL", "2"))
+app.config["JOB_STALE_AFTER"] = float(os.environ.get("JOB_STALE_AFTER", "120"))
+app.config["JOB_MAX_ATTEMPTS"] = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# A failed job is retried after JOB_RETRY_DELAY seconds times its attempts so far
+app.config["JOB_RETRY_DELAY"] = float(os.environ.get("JOB_RETRY_DELAY", "30"))
+
 # Initialize the app with the extension
 db.init_app(app)
 
 with app.app_context():
-    # Import models to create tables
-    import models
-    db.create_all()
+    # Create or upgrade the schema
+    from migrations import run_migrations
+    run_migrations()
 
 # Import and register routes
 from routes import *
 
+# Stored once here, so GET /demo_m3u never writes to the database
+import_demo_playlist()
+
+if app.config["JOB_WORKER_EMBEDDED"]:
+    from job_queue import start_embedded_worker
+    start_embedded_worker()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
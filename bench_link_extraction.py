@@ -0,0 +1,124 @@
+"""Micro-benchmark of playlist link extraction on large pages
+
+    python bench_link_extraction.py [saved_page.html ...] [--repeat 5]
+
+Compares the previous search_m3u_links scan (four uncompiled regexes over
+the whole page, each match passed through urljoin) with find_m3u_links fed
+the page in 64 KB chunks, as it reads a streamed response, and checks that
+both find the same links. Without saved pages, synthetic forum pages of 1,
+5 and 20 MB are used, plus a page of link spellings that are easy to get
+wrong (spaces and parentheses inside links).
+"""
+import argparse
+import random
+import re
+import time
+from urllib.parse import urljoin
+
+from web_scraper import READ_CHUNK_BYTES, find_m3u_links
+
+BASE_URL = 'http://forum.example.com/topic/123/page-1.html'
+
+# Links the previous scan found that a delimiter-based scan can miss
+EDGE_CASES = [
+    '<a href="/files/Lista (1).m3u">lista</a>',
+    '<a href="my list.m3u">minha lista</a>',
+    "<a href='canais abertos.m3u8?tipo=hd'>hd</a>",
+    'nova lista: http://x.com/list(1).m3u funcionando',
+    '<a href="https://cdn.example.org/Filmes (2024)/lista.m3u">2024</a>',
+    'http://iptv.example.net/get.php?user=a&type=m3u_plus&out=ts.m3u',
+    '<a href="/pagina.html">lista.m3u</a>',
+]
+
+
+def legacy_links(content, url):
+    """search_m3u_links before the single-pass extractor, minus the request"""
+    m3u_links = []
+    patterns = [
+        r'href=["\']([^"\']*\.m3u[^"\']*)["\']',
+        r'href=["\']([^"\']*\.m3u8[^"\']*)["\']',
+        r'(https?://[^\s<>"\']+\.m3u[^\s<>"\']*)',
+        r'(https?://[^\s<>"\']+\.m3u8[^\s<>"\']*)'
+    ]
+    for pattern in patterns:
+        for match in re.findall(pattern, content, re.IGNORECASE):
+            if match.startswith('http'):
+                m3u_links.append(match)
+            else:
+                m3u_links.append(urljoin(url, match))
+    return list(set(m3u_links))
+
+
+def synthetic_page(size_bytes, seed=1):
+    """Forum-like HTML: many posts, a few of which link playlists"""
+    random.seed(seed)
+    words = ('lista', 'canais', 'atualizada', 'funcionando', 'obrigado', 'filmes', 'séries', 'hoje')
+    posts = []
+    size = 0
+    post_id = 0
+    while size < size_bytes:
+        post_id += 1
+        text = ' '.join(random.choice(words) for _ in range(random.randint(20, 120)))
+        extra = ''
+        roll = random.random()
+        if roll < 0.02:
+            extra = f'<a href="/files/lista{post_id}.m3u">download</a>'
+        elif roll < 0.04:
+            extra = f' http://iptv{post_id % 50}.example.net/get/{post_id}.m3u8?token=abc '
+        elif roll < 0.05:
+            extra = f'<a href="https://cdn.example.org/{post_id}/playlist.m3u">m3u</a>'
+        post = (f'<div class="post" id="p{post_id}"><div class="avatar"><img src="/img/u{post_id % 300}.png">'
+                f'</div><div class="body"><p>{text}</p>{extra}</div></div>\n')
+        posts.append(post)
+        size += len(post)
+    return '<html><body>' + ''.join(posts) + '</body></html>'
+
+
+def edge_case_page(repeat=200):
+    posts = (f'<div class="post" id="p{i}"><p>{case}</p></div>\n'
+             for i in range(repeat) for case in EDGE_CASES)
+    return '<html><body>' + ''.join(posts) + '</body></html>'
+
+
+def chunked(text, size=READ_CHUNK_BYTES):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help='saved HTML pages')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.pages:
+        inputs = []
+        for path in args.pages:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                inputs.append((path, f.read()))
+    else:
+        inputs = [(f'synthetic {mb} MB', synthetic_page(mb * 1024 * 1024)) for mb in (1, 5, 20)]
+        inputs.append(('edge cases', edge_case_page()))
+
+    print(f"{'page':>18} {'legacy ms':>10} {'links':>6} {'single ms':>10} {'links':>6} {'speedup':>8} {'same':>5}")
+    for name, content in inputs:
+        legacy_time, legacy = best_of(args.repeat, lambda: legacy_links(content, BASE_URL))
+        single_time, single = best_of(args.repeat, lambda: find_m3u_links(chunked(content), BASE_URL))
+        same = 'yes' if set(legacy) == set(single) else 'NO'
+        print(f'{name[-18:]:>18} {legacy_time * 1000:>10.1f} {len(legacy):>6} '
+              f'{single_time * 1000:>10.1f} {len(single):>6} {legacy_time / single_time:>7.1f}x {same:>5}')
+        if same == 'NO':
+            print(f'{"":>18} only legacy: {sorted(set(legacy) - set(single))[:5]}')
+            print(f'{"":>18} only single: {sorted(set(single) - set(legacy))[:5]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark offline HTML generation: whole-string rendering vs. streamed output
+
+    python bench_offline_html.py [--sizes 1000,100000,1000000] [--compress]
+
+For each playlist size, reports the total time, the time until the first
+piece of output is available and the peak memory traced while rendering.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from offline_html_generator import (PAGE_TEMPLATE, PLAYLIST_WORKER_JS, VIRTUAL_GRID_JS,
+                                    build_payload, iter_offline_html)
+
+
+def sample_entries(count):
+    for i in range(count):
+        yield (
+            f'Filme de Exemplo {i}',
+            f'https://vod.example.com/movie/20613489/69683690/{1500000 + i}.mp4',
+            f'https://image.tmdb.org/t/p/w400/poster{i:08d}.jpg',
+            f'(VOD BR) Categoria {i % 60}',
+        )
+
+
+def render_whole(entries, compress):
+    """The page built as one string, as it was before the template was pre-split"""
+    assert not compress, 'whole-string rendering is only measured uncompressed'
+    payload = json.dumps(build_payload(entries), ensure_ascii=False, separators=(',', ':'))
+    page = (PAGE_TEMPLATE
+            .replace('{VIRTUAL_GRID_JS}', VIRTUAL_GRID_JS)
+            .replace('{PLAYLIST_WORKER_JS}', PLAYLIST_WORKER_JS)
+            .replace('{PAYLOAD_TYPE}', 'application/json'))
+    yield page.replace('{PAYLOAD}', payload.replace('<', '\\u003c')).encode('utf-8')
+
+
+def render_streamed(entries, compress):
+    for piece in iter_offline_html(entries, compress):
+        yield piece.encode('utf-8')
+
+
+def _consume(render, count, compress):
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in render(sample_entries(count), compress):
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        # Stands in for writing the chunk to the response
+        size += len(chunk)
+    return time.perf_counter() - started, first_byte, size
+
+
+def measure(render, count, compress):
+    # Timed and traced separately: tracemalloc slows allocation-heavy code many times over
+    total, first_byte, size = _consume(render, count, compress)
+    tracemalloc.start()
+    _consume(render, count, compress)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total, first_byte, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='comma-separated entry counts')
+    parser.add_argument('--compress', action='store_true',
+                        help='gzip+base64 payload (streamed rendering only)')
+    args = parser.parse_args()
+
+    renderers = [('streamed', render_streamed)]
+    if not args.compress:
+        renderers.insert(0, ('whole', render_whole))
+
+    print(f"{'entries':>9} {'mode':>9} {'total s':>9} {'first s':>9} {'peak MB':>9} {'page MB':>9}")
+    for count in (int(size) for size in args.sizes.split(',')):
+        for name, render in renderers:
+            total, first_byte, peak, size = measure(render, count, args.compress)
+            print(f'{count:>9} {name:>9} {total:>9.3f} {first_byte:>9.3f} '
+                  f'{peak / 1e6:>9.1f} {size / 1e6:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
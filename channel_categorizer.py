@@ -0,0 +1,148 @@
+import bisect
+import itertools
+import json
+import re
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_CATEGORY = 'Geral'
+
+# Rules with a lower priority value win when a name matches several of them
+DEFAULT_CATEGORY_RULES = [
+    {'category': 'Esportes', 'priority': 10,
+     'keywords': ['sport', 'espn', 'fox sports', 'sportv', 'combate', 'premiere', 'futebol', 'soccer', 'football']},
+    {'category': 'Notícias', 'priority': 20,
+     'keywords': ['news', 'notícias', 'globo news', 'cnn', 'band news', 'record news', 'sbt news']},
+    {'category': 'Filmes', 'priority': 30,
+     'keywords': ['cinema', 'movie', 'film', 'telecine', 'megapix', 'cinemax', 'hbo', 'paramount']},
+    {'category': 'Infantil', 'priority': 40,
+     'keywords': ['kids', 'infantil', 'cartoon', 'disney', 'nickelodeon', 'discovery kids', 'gloob']},
+    {'category': 'Entretenimento', 'priority': 50,
+     'keywords': ['entretenimento', 'entertainment', 'comedy', 'variety', 'multishow', 'mtv']},
+    {'category': 'Documentários', 'priority': 60,
+     'keywords': ['discovery', 'history', 'national geographic', 'animal planet', 'documentário']},
+]
+
+
+def load_category_rules(path: str) -> List[Dict]:
+    """Load a rule table from a JSON file with the same shape as DEFAULT_CATEGORY_RULES"""
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    for rule in rules:
+        if not rule.get('category') or not rule.get('keywords'):
+            raise ValueError(f"Invalid category rule: {rule}")
+    return rules
+
+
+class ChannelCategorizer:
+    """Categorize channel names with every keyword rule compiled into one regex"""
+
+    def __init__(self, rules: Optional[List[Dict]] = None, default_category: str = DEFAULT_CATEGORY):
+        self.default_category = default_category
+        rules = sorted(rules or DEFAULT_CATEGORY_RULES, key=lambda r: r.get('priority', 0))
+
+        # keyword -> (rank, category); the first (best) rule to claim a keyword owns it
+        self._keywords: Dict[str, tuple] = {}
+        for rank, rule in enumerate(rules):
+            for keyword in rule['keywords']:
+                self._keywords.setdefault(keyword.lower(), (rank, rule['category']))
+
+        # Fast path: one trie-shaped regex, so the engine branches on each
+        # character once instead of trying every keyword at every position.
+        # It reports the longest keyword at each position, without overlaps.
+        self._pattern = re.compile(_trie_regex(self._keywords) or '(?!)')
+        # Exact path: overlapping scan (zero-width lookahead) where, at each
+        # position, the best-ranked and then longest keyword is tried first
+        ordered = sorted(self._keywords, key=lambda k: (self._keywords[k][0], -len(k)))
+        alternation = '|'.join(re.escape(keyword) for keyword in ordered) or '(?!)'
+        self._exact_pattern = re.compile('(?=(' + alternation + '))')
+
+        # The fast path can hide a better-ranked keyword that starts inside a
+        # match, or that is a prefix of it. keyword -> the keywords it can
+        # hide; a name is re-checked with the exact path only if one of them
+        # actually occurs in it.
+        self._hides: Dict[str, tuple] = {}
+        for keyword, (rank, _) in self._keywords.items():
+            hidden = tuple(other for other, (other_rank, _) in self._keywords.items()
+                           if other_rank < rank and self._can_overlap(keyword, other))
+            if hidden:
+                self._hides[keyword] = hidden
+
+    @staticmethod
+    def _can_overlap(keyword: str, other: str) -> bool:
+        """True if `other` can start inside an occurrence of `keyword`"""
+        if other != keyword and keyword.find(other) != -1:
+            return True
+        return any(other.startswith(keyword[i:]) for i in range(1, len(keyword)))
+
+    def _categorize_exact(self, name_lower: str) -> str:
+        best = None
+        for match in self._exact_pattern.finditer(name_lower):
+            entry = self._keywords[match.group(1)]
+            if best is None or entry[0] < best[0]:
+                best = entry
+                if best[0] == 0:
+                    break
+        return best[1] if best else self.default_category
+
+    def categorize(self, channel_name: str, existing_category: Optional[str] = None) -> str:
+        """Return the existing category, or the best matching rule's category"""
+        if existing_category:
+            return existing_category
+        return self._categorize_exact((channel_name or '').lower())
+
+    def categorize_many(self, channels: Iterable[Dict]) -> List[Dict]:
+        """Fill in 'category' for every channel dict that lacks one, in one regex pass"""
+        channels = list(channels)
+        pending = [channel for channel in channels if not channel.get('category')]
+        if not pending:
+            return channels
+
+        names = [(channel.get('name') or '').replace('\n', ' ').lower() for channel in pending]
+        text = '\n'.join(names)
+        # ends[i] is the offset just past name i and its separator
+        ends = list(itertools.accumulate(len(name) + 1 for name in names))
+
+        best = [None] * len(pending)
+        recheck = set()
+        for match in self._pattern.finditer(text):
+            index = bisect.bisect_right(ends, match.start())
+            keyword = match.group()
+            entry = self._keywords[keyword]
+            if best[index] is None or entry[0] < best[index][0]:
+                best[index] = entry
+            hidden = self._hides.get(keyword)
+            if hidden and index not in recheck and any(other in names[index] for other in hidden):
+                recheck.add(index)
+
+        for index, channel in enumerate(pending):
+            if index in recheck:
+                channel['category'] = self._categorize_exact(names[index])
+            elif best[index]:
+                channel['category'] = best[index][1]
+            else:
+                channel['category'] = self.default_category
+
+        return channels
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Build a regex matching any of `words`, shaped like a prefix trie"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A word ends here; greedy '?' still prefers the longer words
+            return ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+        return body
+
+    return build(trie)
+
@@ -0,0 +1,137 @@
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+
+from app import db
+from models import Channel
+
+STATUS_FILTERS = {
+    'working': Channel.is_working.is_(True),
+    'failed': Channel.is_working.is_(False),
+    'untested': Channel.is_working.is_(None),
+}
+
+# sort key -> (expression, descending, cursor value parser). Nullable metrics
+# are coalesced to a value that sorts last, so every row has a comparable key
+# for the cursor.
+SORTS = {
+    'name': (Channel.name, False, str),
+    'ttfb': (func.coalesce(Channel.ttfb_ms, 2 ** 31 - 1), False, int),
+    'speed': (func.coalesce(Channel.segment_kbps, -1.0), True, float),
+    'checked': (func.coalesce(Channel.last_checked, datetime(1970, 1, 1)), True, datetime.fromisoformat),
+}
+DEFAULT_SORT = 'name'
+
+# Category filter value that selects channels without a category
+UNCATEGORIZED = '__none__'
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value, channel_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, channel_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Return (sort_value, channel_id); raises ValueError for a malformed cursor"""
+    try:
+        sort_value, channel_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(channel_id, int):
+        raise ValueError('Invalid cursor')
+    return sort_value, channel_id
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def list_channels(search_id: int, status: Optional[str] = None, category: Optional[str] = None,
+                  name_prefix: Optional[str] = None, sort: str = DEFAULT_SORT,
+                  cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+    """Return one page of a search's channels and the cursor for the next page
+
+    Pages are keyset-paginated on (sort key, id), so fetching a page costs the
+    same no matter how deep into the listing it is.
+    """
+    if sort not in SORTS:
+        raise ValueError(f'Unknown sort: {sort}')
+    if status and status not in STATUS_FILTERS:
+        raise ValueError(f'Unknown status: {status}')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sort_expr, descending, parse_value = SORTS[sort]
+
+    query = select(
+        Channel.id, Channel.name, Channel.url, Channel.category, Channel.logo,
+        Channel.is_working, Channel.last_checked, Channel.ttfb_ms,
+        Channel.segment_kbps, Channel.bandwidth, sort_expr.label('sort_value')
+    ).where(Channel.search_history_id == search_id)
+
+    if status:
+        query = query.where(STATUS_FILTERS[status])
+    if category == UNCATEGORIZED:
+        query = query.where(or_(Channel.category.is_(None), Channel.category == ''))
+    elif category:
+        query = query.where(Channel.category == category)
+    if name_prefix:
+        query = query.where(Channel.name.ilike(_escape_like(name_prefix) + '%', escape='\\'))
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        try:
+            last_value = parse_value(last_value)
+        except (TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+        if descending:
+            query = query.where(or_(sort_expr < last_value, and_(sort_expr == last_value, Channel.id < last_id)))
+        else:
+            query = query.where(or_(sort_expr > last_value, and_(sort_expr == last_value, Channel.id > last_id)))
+
+    if descending:
+        query = query.order_by(sort_expr.desc(), Channel.id.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), Channel.id.asc())
+
+    # One extra row tells whether another page exists
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_value, rows[-1].id)
+
+    channels = [{
+        'id': row.id,
+        'name': row.name,
+        'url': row.url,
+        'category': row.category,
+        'logo': row.logo,
+        'is_working': row.is_working,
+        'last_checked': row.last_checked.isoformat() if row.last_checked else None,
+        'ttfb_ms': row.ttfb_ms,
+        'segment_kbps': row.segment_kbps,
+        'bandwidth': row.bandwidth,
+    } for row in rows]
+    return channels, next_cursor
+
+
+def category_counts(search_id: int) -> List[Tuple[str, int]]:
+    """(category, channel count) pairs for a search, largest first
+
+    Empty and missing categories are counted together under None, matching
+    the UNCATEGORIZED filter.
+    """
+    counts = {}
+    for category, count in db.session.execute(
+        select(Channel.category, func.count())
+        .where(Channel.search_history_id == search_id)
+        .group_by(Channel.category)
+    ).all():
+        counts[category or None] = counts.get(category or None, 0) + count
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0] or ''))
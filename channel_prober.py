@@ -0,0 +1,135 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from host_scheduler import HostScheduler
+from m3u_validator import M3UValidator
+from probe_cache import ProbeCache
+
+
+PROBE_MODES = ('basic', 'hls')
+METRIC_FIELDS = ('ttfb_ms', 'segment_kbps', 'bandwidth')
+
+
+class ChannelProber:
+    """Probe many channel URLs concurrently with a bounded worker pool.
+
+    In 'basic' mode a channel is working if a HEAD/GET succeeds. In 'hls'
+    mode .m3u8 channels get a deep probe and the results also carry the
+    ttfb_ms, segment_kbps and bandwidth metrics.
+    """
+
+    def __init__(self, concurrency: int = 100, batch_size: int = 500,
+                 per_host_concurrency: int = 4, per_host_interval: float = 0.25,
+                 cache: Optional[ProbeCache] = None, mode: str = 'basic'):
+        if mode not in PROBE_MODES:
+            raise ValueError(f"Unknown probe mode '{mode}'")
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.cache = cache
+        # Safe to share between worker threads: each thread gets its own
+        # session on the process-wide connection pools
+        self.validator = M3UValidator()
+
+    def _probe_one(self, channel_id: int, url: str) -> Dict:
+        started = time.monotonic()
+        metrics = None
+        try:
+            if self.mode == 'hls':
+                metrics = self.validator.probe_stream(url)
+                is_working = metrics.pop('is_working')
+            else:
+                is_working = self.validator.test_stream_connectivity(url)
+        except Exception as e:
+            logging.error(f"Error testing channel {channel_id}: {e}")
+            is_working = False
+            if self.mode == 'hls':
+                metrics = dict.fromkeys(METRIC_FIELDS)
+
+        checked_at = datetime.utcnow()
+        if self.cache is not None:
+            self.cache.put(url, is_working, checked_at, time.monotonic() - started, metrics)
+
+        return self._result(channel_id, is_working, checked_at, metrics)
+
+    @staticmethod
+    def _result(channel_id: int, is_working: bool, checked_at: datetime, metrics: Optional[Dict]) -> Dict:
+        # Keys are Channel columns, so a batch feeds a bulk UPDATE directly
+        result = {
+            'id': channel_id,
+            'is_working': is_working,
+            'last_checked': checked_at
+        }
+        if metrics is not None:
+            result.update(metrics)
+        return result
+
+    def _cached(self, url: str) -> Optional[Dict]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(url)
+        # A basic result can't answer a deep probe
+        if cached is not None and self.mode == 'hls' and cached['metrics'] is None:
+            return None
+        return cached
+
+    def probe(self, channels: Iterable[Tuple[int, str]],
+              deadline: Optional[float] = None) -> Iterator[List[Dict]]:
+        """Probe (channel_id, url) pairs and yield results in batches
+
+        With a `deadline` (a time.monotonic() value) no new probes are started
+        once it has passed; probes already in flight still finish and are yielded.
+        """
+        scheduler = HostScheduler(
+            per_host_concurrency=self.per_host_concurrency,
+            min_interval=self.per_host_interval
+        )
+        batch = []
+        for channel_id, url in channels:
+            cached = self._cached(url)
+            if cached is not None:
+                # Recently probed, possibly by another search: no network I/O
+                metrics = cached['metrics'] if self.mode == 'hls' else None
+                batch.append(self._result(channel_id, cached['is_working'], cached['checked_at'], metrics))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            else:
+                scheduler.add(url, (channel_id, url))
+
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while scheduler.pending or in_flight:
+                expired = deadline is not None and time.monotonic() >= deadline
+                if expired and not in_flight:
+                    break
+                delay = None
+                while not expired and len(in_flight) < self.concurrency:
+                    ready, delay = scheduler.next_ready()
+                    if ready is None:
+                        break
+                    host, (channel_id, url) = ready
+                    in_flight[executor.submit(self._probe_one, channel_id, url)] = host
+
+                if not in_flight:
+                    # Every remaining host is inside its politeness interval
+                    time.sleep(delay or 0)
+                    continue
+
+                done, _ = wait(in_flight, timeout=delay, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scheduler.release(in_flight.pop(future))
+                    batch.append(future.result())
+
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+
+        if batch:
+            yield batch
@@ -0,0 +1,155 @@
+import logging
+import re
+from typing import Dict, List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+# Relative weight of a match in the name, category and group columns
+NAME_WEIGHT, CATEGORY_WEIGHT, GROUP_WEIGHT = 10.0, 3.0, 1.0
+
+MAX_RESULTS = 200
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# SQLite: an external-content FTS5 table over channel. Updates and deletes are
+# synced by triggers; inserts are indexed per ingest chunk by index_channels,
+# because a per-row insert trigger makes bulk ingest several times slower.
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS channel_fts USING fts5("
+    "name, category, \"group\", content='channel', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS channel_fts_delete AFTER DELETE ON channel BEGIN "
+    "INSERT INTO channel_fts(channel_fts, rowid, name, category, \"group\") "
+    "VALUES ('delete', old.id, old.name, old.category, old.\"group\"); END",
+    "CREATE TRIGGER IF NOT EXISTS channel_fts_update AFTER UPDATE OF name, category, \"group\" ON channel BEGIN "
+    "INSERT INTO channel_fts(channel_fts, rowid, name, category, \"group\") "
+    "VALUES ('delete', old.id, old.name, old.category, old.\"group\"); "
+    "INSERT INTO channel_fts(rowid, name, category, \"group\") "
+    "VALUES (new.id, new.name, new.category, new.\"group\"); END",
+]
+
+# PostgreSQL: a generated, weighted tsvector column with a GIN index
+POSTGRES_FTS_DDL = [
+    "ALTER TABLE channel ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"group\", '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_channel_search_vector ON channel USING GIN (search_vector)",
+]
+
+
+def install_fts(conn) -> None:
+    """Create the full-text index for the current database and fill it"""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        exists = inspect(conn).has_table('channel_fts')
+        try:
+            for statement in SQLITE_FTS_DDL:
+                conn.execute(text(statement))
+        except OperationalError as e:
+            # SQLite built without FTS5: search falls back to LIKE
+            logging.warning(f"Full-text search unavailable: {e}")
+            return
+        if not exists:
+            conn.execute(text("INSERT INTO channel_fts(channel_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_FTS_DDL:
+            conn.execute(text(statement))
+    else:
+        logging.warning(f"Full-text search is not supported on {dialect}")
+
+
+def index_channels(search_id: int, after_id: int) -> None:
+    """Add a search's channels with ids above `after_id` to the index (not committed)"""
+    dialect = db.engine.dialect.name
+    if dialect != 'sqlite' or not _fts_available(dialect):
+        # The PostgreSQL tsvector column is maintained by the database itself
+        return
+    db.session.execute(
+        text('INSERT INTO channel_fts(rowid, name, category, "group") '
+             'SELECT id, name, category, "group" FROM channel '
+             'WHERE search_history_id = :search_id AND id > :after_id'),
+        {'search_id': search_id, 'after_id': after_id}
+    )
+
+
+def _tokens(query: str) -> List[str]:
+    return _TOKEN_RE.findall(query.lower())
+
+
+# Databases whose SQLite FTS5 table is known to exist
+_fts_databases = set()
+
+
+def _fts_available(dialect: str) -> bool:
+    if dialect != 'sqlite':
+        return dialect == 'postgresql'
+    url = str(db.engine.url)
+    if url not in _fts_databases and inspect(db.engine).has_table('channel_fts'):
+        _fts_databases.add(url)
+    return url in _fts_databases
+
+
+def search_channels(query: str, working_only: bool = False, limit: int = 50) -> List[Dict]:
+    """Rank channels of every stored search against a free-text query
+
+    Every word must match name, category or group; the last word also
+    matches as a prefix, so partially typed queries find results.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    dialect = db.engine.dialect.name
+    working = ' AND c.is_working IS TRUE' if working_only else ''
+    columns = ('c.id, c.name, c.category, c."group", c.url, c.logo, c.is_working, c.last_checked, '
+               'c.search_history_id, s.title AS search_title')
+
+    if not _fts_available(dialect):
+        # Without an index this is a scan; kept only so the endpoint still works
+        conditions = ' AND '.join(f'lower(c.name) LIKE :t{i}' for i in range(len(tokens)))
+        params = {f't{i}': f'%{token}%' for i, token in enumerate(tokens)}
+        sql = (f'SELECT {columns}, 0 AS rank FROM channel c '
+               f'JOIN search_history s ON s.id = c.search_history_id '
+               f'WHERE {conditions}{working} ORDER BY c.id DESC LIMIT :limit')
+    elif dialect == 'sqlite':
+        # Quoted tokens can't be read as FTS5 operators
+        match = ' '.join(f'"{token}"' for token in tokens) + '*'
+        params = {'match': match}
+        sql = (f'SELECT {columns}, bm25(channel_fts, {NAME_WEIGHT}, {CATEGORY_WEIGHT}, {GROUP_WEIGHT}) AS rank '
+               f'FROM channel_fts JOIN channel c ON c.id = channel_fts.rowid '
+               f'JOIN search_history s ON s.id = c.search_history_id '
+               f'WHERE channel_fts MATCH :match{working} ORDER BY rank LIMIT :limit')
+    else:
+        # \w tokens contain no tsquery operators
+        params = {'tsquery': ' & '.join(tokens[:-1] + [tokens[-1] + ':*'])}
+        sql = (f"SELECT {columns}, ts_rank(c.search_vector, to_tsquery('simple', :tsquery)) AS rank "
+               f"FROM channel c JOIN search_history s ON s.id = c.search_history_id "
+               f"WHERE c.search_vector @@ to_tsquery('simple', :tsquery){working} "
+               f"ORDER BY rank DESC LIMIT :limit")
+
+    params['limit'] = limit
+    rows = db.session.execute(text(sql), params).mappings().all()
+    return [{
+        'id': row['id'],
+        'name': row['name'],
+        'category': row['category'],
+        'group': row['group'],
+        'url': row['url'],
+        'logo': row['logo'],
+        'is_working': None if row['is_working'] is None else bool(row['is_working']),
+        'last_checked': _isoformat(row['last_checked']),
+        'search_id': row['search_history_id'],
+        'search_title': row['search_title'],
+        'rank': row['rank'],
+    } for row in rows]
+
+
+def _isoformat(value):
+    # Raw SQL on SQLite returns timestamps as strings
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
@@ -0,0 +1,89 @@
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class HostScheduler:
+    """Hand out work items round-robin across hosts with per-host limits.
+
+    Each host gets at most `per_host_concurrency` items in flight and its
+    requests are started at least `min_interval` seconds apart. Hosts are
+    interleaved so a single slow origin never holds up the rest of the list.
+    Not thread-safe: it is meant to be driven by a single dispatcher.
+    """
+
+    def __init__(self, per_host_concurrency: int = 4, min_interval: float = 0.25):
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.min_interval = max(0.0, min_interval)
+        self._queues: Dict[str, deque] = {}
+        self._hosts = deque()
+        self._active: Dict[str, int] = {}
+        self._next_allowed: Dict[str, float] = {}
+        self._pending = 0
+
+    @staticmethod
+    def host_for(url: str) -> str:
+        """Return the scheduling key for a URL"""
+        try:
+            return urlparse(url).netloc.lower()
+        except ValueError:
+            return ''
+
+    def add(self, url: str, item: Any) -> None:
+        """Queue an item to be dispatched against the host of `url`"""
+        host = self.host_for(url)
+        if host not in self._queues:
+            self._queues[host] = deque()
+            self._hosts.append(host)
+            self._active.setdefault(host, 0)
+        self._queues[host].append(item)
+        self._pending += 1
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def next_ready(self) -> Tuple[Optional[Tuple[str, Any]], Optional[float]]:
+        """Pop the next dispatchable (host, item).
+
+        Returns ((host, item), None) when something can start now. Otherwise
+        returns (None, delay) where delay is the number of seconds until a
+        host's interval expires, or None if every host with work is at its
+        concurrency cap and the caller should wait for a release instead.
+        """
+        now = time.monotonic()
+        delay = None
+
+        for _ in range(len(self._hosts)):
+            host = self._hosts[0]
+            self._hosts.rotate(-1)
+
+            if self._active[host] >= self.per_host_concurrency:
+                continue
+
+            wait_for = self._next_allowed.get(host, 0.0) - now
+            if wait_for > 0:
+                delay = wait_for if delay is None else min(delay, wait_for)
+                continue
+
+            queue = self._queues[host]
+            item = queue.popleft()
+            if not queue:
+                # Host has nothing left to hand out; drop it from the rotation
+                del self._queues[host]
+                self._hosts.remove(host)
+
+            self._pending -= 1
+            self._active[host] += 1
+            self._next_allowed[host] = now + self.min_interval
+            return (host, item), None
+
+        return None, delay
+
+    def release(self, host: str) -> None:
+        """Mark an item dispatched for `host` as finished"""
+        self._active[host] -= 1
+        if self._active[host] <= 0 and host not in self._queues:
+            del self._active[host]
+            self._next_allowed.pop(host, None)
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from probe_cache import normalize_url
+
+
+class HTTPCache:
+    """Disk-backed cache of HTTP response bodies, revalidated with conditional GETs
+
+    Every URL gets a `<key>.body` file and a `<key>.json` file holding its
+    ETag / Last-Modified validators. Once the bodies exceed `max_bytes`, the
+    least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return the stored metadata for `url`, or None if nothing usable is cached"""
+        if not self.enabled:
+            return None
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if os.path.getsize(body_path) != meta.get('size'):
+                return None
+        except (OSError, ValueError):
+            return None
+        meta['path'] = body_path
+        return meta
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Request headers that let the server answer 304 Not Modified"""
+        meta = self.lookup(url)
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def iter_body(self, url: str, chunk_size: int = 64 * 1024) -> Optional[Iterator[bytes]]:
+        """Open the cached body for streaming, or return None if it is gone"""
+        meta = self.lookup(url)
+        if meta is None:
+            return None
+        try:
+            f = open(meta['path'], 'rb')
+            os.utime(meta['path'])
+        except OSError:
+            return None
+
+        def chunks():
+            with f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        return chunks()
+
+    def writer(self, url: str, headers, encoding: Optional[str] = None) -> Optional['CacheWriter']:
+        """Return a writer for a response body, or None if it can't be revalidated later"""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not self.enabled or not (etag or last_modified):
+            return None
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'encoding': encoding}
+        try:
+            return CacheWriter(self, url, meta)
+        except OSError as e:
+            logging.warning(f"Could not cache response for {url}: {e}")
+            return None
+
+    def evict(self) -> None:
+        """Remove least recently used bodies until the total fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.body'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for stale in (path, path[:-len('.body')] + '.json'):
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+                total -= size
+
+
+class CacheWriter:
+    """Writes a body to a temporary file that only replaces the cache entry on commit"""
+
+    def __init__(self, cache: HTTPCache, url: str, meta: Dict):
+        self.cache = cache
+        self.meta = meta
+        self.meta_path, self.body_path = cache._paths(url)
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        """Publish the body and its metadata, then enforce the size limit"""
+        try:
+            self._file.close()
+            meta = dict(self.meta, size=self.size, stored_at=time.time())
+            with self.cache._lock:
+                os.replace(self.tmp_path, self.body_path)
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+        except OSError as e:
+            logging.warning(f"Could not cache response for {self.meta['url']}: {e}")
+            self.abort()
+            return
+        self.cache.evict()
+
+    def abort(self) -> None:
+        """Drop a partial body, e.g. after an interrupted or oversized download"""
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,220 @@
+import logging
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+import urllib3.util.connection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+# Transient gateway errors worth one more try; anything else is the answer
+RETRY_STATUSES = (502, 503, 504)
+
+
+class DNSCache:
+    """Process-wide TTL cache of resolved host addresses for urllib3 connections
+
+    Once installed, every new urllib3 connection resolves its host through
+    this cache, so probing thousands of channels on the same panel does one
+    lookup per TTL instead of one per connection. Addresses are tried in
+    order; a host whose addresses all fail is resolved again next time.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+        self._create_connection = None
+        self.hits = 0
+        self.misses = 0
+
+    def install(self):
+        """Route urllib3's connection setup through the cache (idempotent)"""
+        if self._create_connection is None:
+            self._create_connection = urllib3.util.connection.create_connection
+            urllib3.util.connection.create_connection = self.create_connection
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        addresses = []
+        for *_, sockaddr in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host: str, port: int):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def create_connection(self, address, *args, **kwargs):
+        host, port = address
+        if host.startswith('['):
+            host = host.strip('[]')
+        # IP literals and local names gain nothing from caching
+        if not host or host == 'localhost' or _is_ip_address(host):
+            return self._create_connection(address, *args, **kwargs)
+
+        # Resolution errors are raised as socket.gaierror, as urllib3 expects
+        addresses = self.resolve(host, port)
+        error = None
+        for ip in addresses:
+            try:
+                return self._create_connection((ip, port), *args, **kwargs)
+            except OSError as e:
+                error = e
+        self.forget(host, port)
+        if error is None:
+            raise socket.gaierror(f"No addresses found for {host}")
+        raise error
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {'ttl': self.ttl, 'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+
+def _is_ip_address(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except (OSError, ValueError):
+            pass
+    return False
+
+
+# A single cache: urllib3's connection setup can only be wrapped once
+dns_cache = DNSCache()
+
+
+class HTTPClient:
+    """Pooled, keep-alive HTTP client shared by everything that fetches URLs
+
+    One HTTPAdapter, and so one urllib3 pool per host, is shared by all
+    threads: connections (and their TLS sessions) opened by one job are
+    reused by the next. requests.Session itself is not safe to share between
+    threads, so each thread gets its own lightweight session mounted on the
+    shared adapter. Retries and timeouts are applied the same way everywhere.
+    """
+
+    def __init__(self, pool_connections: int = 100, pool_maxsize: int = 16,
+                 retries: int = 1, backoff_factor: float = 0.3,
+                 connect_timeout: float = 5, read_timeout: float = 10,
+                 probe_timeout: float = 5, dns_cache_ttl: float = 300):
+        self.retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries, other=0,
+            status_forcelist=RETRY_STATUSES, allowed_methods=frozenset({'GET', 'HEAD'}),
+            backoff_factor=backoff_factor, raise_on_status=False,
+            respect_retry_after_header=False
+        )
+        # pool_connections: hosts with a pool kept open (least recently used
+        # are dropped); pool_maxsize: idle connections kept per host
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize, max_retries=self.retry)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        # (connect, read) timeouts for pages and playlists, and for stream probes
+        self.timeout = (connect_timeout, read_timeout)
+        self.probe_timeout = (connect_timeout, probe_timeout)
+        self.dns_cache = None
+        if dns_cache_ttl > 0:
+            dns_cache.ttl = dns_cache_ttl
+            dns_cache.install()
+            self.dns_cache = dns_cache
+        self._local = threading.local()
+
+    def session(self) -> requests.Session:
+        """The calling thread's session; never close it, the adapter is shared"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session().get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session().head(url, **kwargs)
+
+    def stats(self) -> Dict:
+        """Per-host pool usage, for tuning pool_connections and pool_maxsize"""
+        pools = self.adapter.poolmanager.pools
+        hosts = []
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # The queue is pre-filled with None placeholders; only real
+            # connections are idle ones
+            idle = sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool is not None else 0
+            hosts.append({
+                'host': f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+                'requests': pool.num_requests,
+                'connections_opened': pool.num_connections,
+                # Requests that didn't need a new connection (or handshake)
+                'reused': max(0, pool.num_requests - pool.num_connections),
+                'idle': idle,
+                'maxsize': pool.pool.maxsize if pool.pool is not None else self.pool_maxsize,
+            })
+        hosts.sort(key=lambda host: host['requests'], reverse=True)
+        return {
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'pools': len(hosts),
+            'requests': sum(host['requests'] for host in hosts),
+            'connections_opened': sum(host['connections_opened'] for host in hosts),
+            'retries': self.retry.total,
+            'timeout': list(self.timeout),
+            'probe_timeout': list(self.probe_timeout),
+            'dns': self.dns_cache.stats() if self.dns_cache else None,
+            'hosts': hosts,
+        }
+
+
+_shared_client: Optional[HTTPClient] = None
+_shared_lock = threading.Lock()
+
+
+def configure_shared_client(**settings) -> HTTPClient:
+    """Replace the process-wide client; call once at startup, before any requests"""
+    global _shared_client
+    with _shared_lock:
+        _shared_client = HTTPClient(**settings)
+        logging.info(f"HTTP client configured: {settings}")
+        return _shared_client
+
+
+def shared_client() -> HTTPClient:
+    """The process-wide client, with default settings unless configured"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = HTTPClient()
+    return _shared_client
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import Job
+
+# kind -> handler(payload, context)
+HANDLERS: Dict[str, Callable] = {}
+
+# kind -> interval in seconds for jobs the workers enqueue on their own
+PERIODIC_JOBS: Dict[str, float] = {}
+
+# Every lane gets its own worker thread. Long jobs (a whole search) run in
+# 'default'; 'interactive' is for quick jobs a user is waiting on and
+# 'periodic' for scheduled maintenance, which never delays either of them.
+DEFAULT_LANE = 'default'
+INTERACTIVE_LANE = 'interactive'
+PERIODIC_LANE = 'periodic'
+LANES = (DEFAULT_LANE, INTERACTIVE_LANE, PERIODIC_LANE)
+
+
+def job_handler(kind: str):
+    """Register the function that runs jobs of the given kind"""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def schedule_periodic(kind: str, interval: float) -> None:
+    """Have the periodic lane's workers enqueue a `kind` job every `interval` seconds"""
+    PERIODIC_JOBS[kind] = interval
+
+
+def enqueue(kind: str, search_history_id: Optional[int] = None, lane: str = DEFAULT_LANE,
+            **payload) -> int:
+    """Persist a job so any worker serving `lane` can pick it up, even after a restart"""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status='queued',
+        lane=lane,
+        search_history_id=search_history_id,
+        attempts=0,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+class JobContext:
+    """Handle passed to job handlers for checkpointing progress"""
+
+    def __init__(self, job_id: int, checkpoint: Optional[str], attempts: int):
+        self.job_id = job_id
+        self.checkpoint = json.loads(checkpoint) if checkpoint else {}
+        # A job that was already started once is being resumed after a crash
+        self.resume = attempts > 1
+
+    def save(self, **data) -> None:
+        """Merge `data` into the job checkpoint and commit it immediately"""
+        self.checkpoint.update(data)
+        # Separate connection so the handler's own session is never committed here
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job).where(Job.id == self.job_id).values(
+                    checkpoint=json.dumps(self.checkpoint),
+                    heartbeat_at=datetime.utcnow()
+                )
+            )
+
+
+class JobWorker:
+    """Claims queued jobs of its lanes from the database and runs them one at a time
+
+    A job that raises is queued again after `retry_delay` seconds (times
+    the attempts so far) until it has run `max_attempts` times.
+    """
+
+    def __init__(self, poll_interval: float = 2.0, stale_after: float = 120,
+                 max_attempts: int = 3, lanes: Sequence[str] = LANES,
+                 retry_delay: float = 30):
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.lanes = tuple(lanes)
+        self.retry_delay = retry_delay
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def requeue_stale_jobs(self) -> int:
+        """Return jobs whose worker stopped heartbeating to the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job)
+                .where(Job.status == 'running', Job.heartbeat_at < cutoff,
+                       Job.attempts >= self.max_attempts)
+                .values(status='failed', error='Worker lost too many times',
+                        finished_at=datetime.utcnow())
+            )
+            result = conn.execute(
+                update(Job)
+                .where(Job.status == 'running', Job.heartbeat_at < cutoff)
+                .values(status='queued', worker=None)
+            )
+        if result.rowcount:
+            logging.warning(f"Requeued {result.rowcount} interrupted job(s)")
+        return result.rowcount
+
+    def enqueue_periodic_jobs(self) -> None:
+        """Enqueue periodic jobs that are due and not already pending"""
+        if PERIODIC_LANE not in self.lanes:
+            return
+        now = datetime.utcnow()
+        for kind, interval in PERIODIC_JOBS.items():
+            pending = db.session.execute(
+                select(Job.id).where(Job.kind == kind, Job.status.in_(('queued', 'running'))).limit(1)
+            ).scalar()
+            if pending is not None:
+                continue
+            last_run = db.session.execute(
+                select(Job.created_at).where(Job.kind == kind).order_by(Job.id.desc()).limit(1)
+            ).scalar()
+            if last_run is None or last_run <= now - timedelta(seconds=interval):
+                try:
+                    enqueue(kind, lane=PERIODIC_LANE)
+                except IntegrityError:
+                    # Another worker (or process) enqueued it first
+                    db.session.rollback()
+        db.session.rollback()
+
+    def claim_next(self) -> Optional[Job]:
+        """Atomically move the oldest due queued job of this worker's lanes to running"""
+        while True:
+            job_id = db.session.execute(
+                select(Job.id)
+                .where(Job.status == 'queued', Job.lane.in_(self.lanes),
+                       or_(Job.run_after.is_(None), Job.run_after <= datetime.utcnow()))
+                .order_by(Job.id).limit(1)
+            ).scalar()
+            if job_id is None:
+                db.session.rollback()
+                return None
+
+            now = datetime.utcnow()
+            # The status guard makes the claim safe against other workers
+            result = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', worker=self.name, attempts=Job.attempts + 1,
+                        started_at=now, heartbeat_at=now)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return db.session.get(Job, job_id)
+
+    def run_job(self, job: Job) -> None:
+        handler = HANDLERS.get(job.kind)
+        job_id = job.id
+        context = JobContext(job_id, job.checkpoint, job.attempts)
+        payload = json.loads(job.payload or '{}')
+
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, heartbeat_stop), daemon=True)
+        heartbeat.start()
+
+        attempts = job.attempts
+        values = {'status': 'done', 'error': None, 'finished_at': datetime.utcnow()}
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job.kind}'")
+            handler(payload, context)
+        except Exception as e:
+            logging.exception(f"Job {job_id} ({job.kind}) failed on attempt {attempts}")
+            db.session.rollback()
+            values = {'status': 'failed', 'error': str(e), 'finished_at': datetime.utcnow()}
+            if handler is not None and attempts < self.max_attempts:
+                # Resumed from its checkpoint on the next attempt
+                values.update(status='queued', worker=None, finished_at=None,
+                              run_after=datetime.utcnow() + timedelta(seconds=self.retry_delay * attempts))
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+
+    def _heartbeat(self, job_id: int, stop: threading.Event) -> None:
+        interval = max(self.stale_after / 4, 1)
+        while not stop.wait(interval):
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        update(Job).where(Job.id == job_id).values(heartbeat_at=datetime.utcnow())
+                    )
+
+    def run(self, once: bool = False) -> None:
+        """Process jobs until stopped (or until the queue is empty if `once`)"""
+        with app.app_context():
+            self.requeue_stale_jobs()
+            while not self._stop.is_set():
+                try:
+                    self.enqueue_periodic_jobs()
+                    job = self.claim_next()
+                except Exception as e:
+                    logging.error(f"Error claiming job: {e}")
+                    db.session.rollback()
+                    job = None
+
+                if job is None:
+                    if once:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    self.requeue_stale_jobs()
+                    continue
+
+                self.run_job(job)
+                db.session.remove()
+
+
+def start_worker_threads(lanes: Sequence[str] = LANES) -> List[threading.Thread]:
+    """Run one job worker per lane, each on its own daemon thread"""
+    threads = []
+    for lane in lanes:
+        worker = JobWorker(
+            poll_interval=app.config['JOB_POLL_INTERVAL'],
+            stale_after=app.config['JOB_STALE_AFTER'],
+            max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+            lanes=(lane,),
+            retry_delay=app.config['JOB_RETRY_DELAY']
+        )
+        thread = threading.Thread(target=worker.run, name=f'job-worker-{lane}', daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def start_embedded_worker() -> List[threading.Thread]:
+    """Run the job workers on daemon threads inside the web process"""
+    return start_worker_threads()
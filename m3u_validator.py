@@ -1,55 +1,154 @@
+import codecs
 import re
+import time
 import requests
 from urllib.parse import urlparse, urljoin
 import logging
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from http_client import HTTPClient, shared_client
+
+class PlaylistTooLarge(ValueError):
+    """Raised while streaming a playlist that exceeds the configured maximum size"""
+
 
 class M3UValidator:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        self.timeout = 10
+    # Upper bounds for what a deep probe downloads
+    PLAYLIST_PROBE_BYTES = 256 * 1024
+    SEGMENT_PROBE_BYTES = 128 * 1024
+    # Read size when streaming a playlist body
+    STREAM_CHUNK_BYTES = 64 * 1024
+    
+    def __init__(self, http_cache=None, max_playlist_bytes: Optional[int] = None,
+                 http_client: Optional[HTTPClient] = None):
+        # Optional HTTPCache used to revalidate playlists instead of re-downloading them
+        self.http_cache = http_cache
+        self.max_playlist_bytes = max_playlist_bytes
+        # Connection pools, retries and timeouts are shared with the rest of the process
+        self.http = http_client or shared_client()
+        self.timeout = self.http.timeout
+        self.probe_timeout = self.http.probe_timeout
+    
+    @property
+    def session(self):
+        # The calling thread's session, so one validator can serve many threads
+        return self.http.session()
         
-    def fetch_m3u_content(self, url: str) -> Optional[str]:
-        """Fetch M3U content from URL"""
+    def open_m3u_stream(self, url: str) -> Optional[Iterator[str]]:
+        """Start downloading a playlist and return an iterator over its decoded lines
+        
+        The body is read and decoded in chunks, so memory use does not grow with
+        the playlist size. Returns None if the request itself fails; errors later
+        in the transfer (including PlaylistTooLarge) are raised while iterating.
+        """
+        cache = self.http_cache
         try:
-            response = self.session.get(url, timeout=self.timeout)
+            headers = cache.conditional_headers(url) if cache else {}
+            response = self.session.get(url, timeout=self.timeout, headers=headers, stream=True)
+            
+            if response.status_code == 304 and headers:
+                response.close()
+                meta = cache.lookup(url)
+                body = cache.iter_body(url)
+                if body is not None:
+                    logging.info(f"Playlist not modified, using cached copy: {url}")
+                    return self._iter_lines(body, meta.get('encoding') or 'utf-8-sig')
+                # Cache entry vanished between the request and the read
+                response = self.session.get(url, timeout=self.timeout, stream=True)
+            
+            if not response.ok:
+                # Hand the connection back to the pool before giving up
+                response.close()
             response.raise_for_status()
-            return response.text
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching M3U from {url}: {e}")
             return None
-    
-    def validate_m3u_format(self, content: str) -> bool:
-        """Validate if content is in M3U format"""
-        if not content:
-            return False
-        
-        # Check for M3U header
-        if not content.strip().startswith('#EXTM3U'):
-            return False
-        
-        # Check for at least one channel entry
-        if '#EXTINF:' not in content:
-            return False
         
-        return True
+        encoding = self._stream_encoding(response)
+        writer = cache.writer(url, response.headers, encoding) if cache else None
+        return self._iter_lines(self._iter_body(response, writer), encoding)
     
-    def parse_m3u_content(self, content: str) -> List[Dict]:
-        """Parse M3U content and extract channel information"""
-        channels = []
-        
-        if not self.validate_m3u_format(content):
-            return channels
+    def iter_m3u_lines(self, chunks: Iterable[bytes], encoding: str = 'utf-8-sig') -> Iterator[str]:
+        """Decode a playlist given as byte chunks (e.g. an upload) line by line, within the size limit"""
+        return self._iter_lines(self._enforce_size(chunks), encoding)
+    
+    def _enforce_size(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        received = 0
+        for chunk in chunks:
+            received += len(chunk)
+            if self.max_playlist_bytes and received > self.max_playlist_bytes:
+                raise PlaylistTooLarge(
+                    f"Lista maior que o limite de {self.max_playlist_bytes / (1024 * 1024):g} MB"
+                )
+            yield chunk
+    
+    def _iter_body(self, response, writer=None) -> Iterator[bytes]:
+        """Yield raw body chunks, enforcing the size limit and teeing them into the cache"""
+        try:
+            with response:
+                for chunk in self._enforce_size(response.iter_content(chunk_size=self.STREAM_CHUNK_BYTES)):
+                    if writer:
+                        writer.write(chunk)
+                    yield chunk
+            # Only complete bodies are cached
+            if writer:
+                writer.commit()
+                writer = None
+        finally:
+            if writer:
+                writer.abort()
+    
+    @staticmethod
+    def _stream_encoding(response) -> str:
+        """Charset declared by the server, else UTF-8 (the M3U8 default)"""
+        match = re.search(r'charset=["\']?([\w.:-]+)', response.headers.get('Content-Type', ''), re.IGNORECASE)
+        encoding = match.group(1) if match else 'utf-8'
+        try:
+            name = codecs.lookup(encoding).name
+        except LookupError:
+            name = 'utf-8'
+        # A byte order mark must not hide the #EXTM3U header
+        return 'utf-8-sig' if name == 'utf-8' else encoding
+    
+    @staticmethod
+    def _iter_lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+        """Incrementally decode byte chunks and yield complete lines"""
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        pending = ''
+        for chunk in chunks:
+            lines = (pending + decoder.decode(chunk)).split('\n')
+            pending = lines.pop()
+            yield from lines
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+    
+    def parse_m3u_content(self, content: Union[str, Iterable[str]],
+                          info: Optional[Dict] = None) -> Iterator[Dict]:
+        """Parse M3U content (a string or an iterable of lines) and yield channel information
         
-        lines = content.strip().split('\n')
+        Channels are yielded as they are parsed. If `info` is given, its 'title'
+        is set from the #EXTM3U header as soon as that line has been read.
+        """
+        lines = content.splitlines() if isinstance(content, str) else content
+        header_seen = False
         current_channel = {}
         
         for line in lines:
             line = line.strip()
             
+            if not header_seen:
+                line = line.lstrip('\ufeff')
+                if not line:
+                    continue
+                if not line.startswith('#EXTM3U'):
+                    # Not an M3U playlist
+                    return
+                header_seen = True
+                if info is not None:
+                    title_match = re.search(r'title="([^"]*)"', line, re.IGNORECASE)
+                    info['title'] = title_match.group(1) if title_match else None
+                continue
+            
             if line.startswith('#EXTINF:'):
                 # Parse channel info
                 current_channel = self._parse_extinf_line(line)
@@ -58,10 +157,8 @@ class M3UValidator:
                 # This is the URL line
                 if current_channel:
                     current_channel['url'] = line
-                    channels.append(current_channel)
+                    yield current_channel
                     current_channel = {}
-        
-        return channels
     
     def _parse_extinf_line(self, line: str) -> Dict:
         """Parse EXTINF line to extract channel metadata"""
@@ -88,58 +185,22 @@ class M3UValidator:
         
         return channel_info
     
-    def categorize_channel(self, channel_name: str, existing_category: str = None) -> str:
-        """Automatically categorize channel based on name"""
-        if existing_category:
-            return existing_category
-        
-        channel_name_lower = channel_name.lower()
-        
-        # Sports categories
-        sports_keywords = ['sport', 'espn', 'fox sports', 'sportv', 'combate', 'premiere', 'futebol', 'soccer', 'football']
-        if any(keyword in channel_name_lower for keyword in sports_keywords):
-            return 'Esportes'
-        
-        # News categories
-        news_keywords = ['news', 'notícias', 'globo news', 'cnn', 'band news', 'record news', 'sbt news']
-        if any(keyword in channel_name_lower for keyword in news_keywords):
-            return 'Notícias'
-        
-        # Movies categories
-        movie_keywords = ['cinema', 'movie', 'film', 'telecine', 'megapix', 'cinemax', 'hbo', 'paramount']
-        if any(keyword in channel_name_lower for keyword in movie_keywords):
-            return 'Filmes'
-        
-        # Kids categories
-        kids_keywords = ['kids', 'infantil', 'cartoon', 'disney', 'nickelodeon', 'discovery kids', 'gloob']
-        if any(keyword in channel_name_lower for keyword in kids_keywords):
-            return 'Infantil'
-        
-        # Entertainment categories
-        entertainment_keywords = ['entretenimento', 'entertainment', 'comedy', 'variety', 'multishow', 'mtv']
-        if any(keyword in channel_name_lower for keyword in entertainment_keywords):
-            return 'Entretenimento'
-        
-        # Documentary categories
-        doc_keywords = ['discovery', 'history', 'national geographic', 'animal planet', 'documentário']
-        if any(keyword in channel_name_lower for keyword in doc_keywords):
-            return 'Documentários'
-        
-        return 'Geral'
-    
     def test_stream_connectivity(self, url: str) -> bool:
         """Test if stream URL is accessible"""
         try:
             # First try HEAD request
-            response = self.session.head(url, timeout=5, allow_redirects=True)
+            response = self.session.head(url, timeout=self.probe_timeout, allow_redirects=True)
             
             # If HEAD fails, try GET with limited data
             if response.status_code >= 400:
-                response = self.session.get(url, timeout=5, stream=True)
-                # Read just a small amount to test connectivity
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        break
+                response = self.session.get(url, timeout=self.probe_timeout, stream=True)
+                # Read just a small amount to test connectivity. Closing an
+                # unfinished live stream drops its connection instead of
+                # pooling it, but never leaks it.
+                with response:
+                    for chunk in response.iter_content(chunk_size=1024):
+                        if chunk:
+                            break
             
             return response.status_code < 400
             
@@ -147,25 +208,98 @@ class M3UValidator:
             logging.debug(f"Stream test failed for {url}: {e}")
             return False
     
-    def extract_playlist_info(self, content: str) -> Dict:
-        """Extract general playlist information"""
-        info = {
-            'title': None,
-            'description': None,
-            'total_channels': 0,
-            'categories': set()
-        }
-        
-        # Count total channels
-        info['total_channels'] = content.count('#EXTINF:')
-        
-        # Extract title
-        title_match = re.search(r'#EXTM3U.*?title="([^"]*)"', content, re.IGNORECASE)
-        if title_match:
-            info['title'] = title_match.group(1)
+    def probe_stream(self, url: str) -> Dict:
+        """Deep probe: for HLS streams, measure a real media segment download"""
+        result = {'is_working': False, 'ttfb_ms': None, 'segment_kbps': None, 'bandwidth': None}
         
-        # Extract categories
-        category_matches = re.findall(r'group-title="([^"]*)"', content, re.IGNORECASE)
-        info['categories'] = set(category_matches) if category_matches else set()
+        if not urlparse(url).path.lower().endswith('.m3u8'):
+            result['is_working'] = self.test_stream_connectivity(url)
+            return result
         
-        return info
+        try:
+            playlist_url, playlist = self._fetch_hls_playlist(url)
+            if playlist is None:
+                return result
+            
+            # Master playlist: follow the highest advertised variant
+            variants = self._parse_hls_variants(playlist, playlist_url)
+            if variants:
+                result['bandwidth'], variant_url = max(variants)
+                playlist_url, playlist = self._fetch_hls_playlist(variant_url)
+                if playlist is None:
+                    return result
+            
+            segment_url = self._first_hls_segment(playlist, playlist_url)
+            if not segment_url:
+                return result
+            
+            # Only the first bytes of the segment are downloaded
+            started = time.monotonic()
+            response = self.session.get(
+                segment_url, timeout=self.probe_timeout, stream=True,
+                headers={'Range': f'bytes=0-{self.SEGMENT_PROBE_BYTES - 1}'}
+            )
+            with response:
+                if response.status_code >= 400:
+                    return result
+                received = 0
+                first_byte_at = None
+                for chunk in response.iter_content(chunk_size=8192):
+                    if not chunk:
+                        continue
+                    if first_byte_at is None:
+                        first_byte_at = time.monotonic()
+                    received += len(chunk)
+                    if received >= self.SEGMENT_PROBE_BYTES:
+                        break
+                finished = time.monotonic()
+            
+            if not received:
+                return result
+            
+            result['is_working'] = True
+            result['ttfb_ms'] = int((first_byte_at - started) * 1000)
+            transfer_time = finished - first_byte_at
+            if transfer_time > 0:
+                result['segment_kbps'] = round(received * 8 / 1000 / transfer_time, 1)
+            return result
+            
+        except requests.exceptions.RequestException as e:
+            logging.debug(f"Deep probe failed for {url}: {e}")
+            return result
+    
+    def _fetch_hls_playlist(self, url: str):
+        """Fetch an HLS playlist; returns (final_url, text) or (url, None) if it isn't one"""
+        response = self.session.get(url, timeout=self.probe_timeout, stream=True)
+        with response:
+            if response.status_code >= 400:
+                return url, None
+            # Playlists are small; cap the read so a mislabeled stream can't be slurped
+            body = response.raw.read(self.PLAYLIST_PROBE_BYTES, decode_content=True)
+        text = body.decode('utf-8', errors='replace')
+        # Many panels answer 200 with an HTML error page for dead channels
+        if not text.lstrip('\ufeff').lstrip().startswith('#EXTM3U'):
+            return url, None
+        return response.url, text
+    
+    def _parse_hls_variants(self, playlist: str, base_url: str) -> List:
+        """Return (bandwidth, absolute_url) pairs from a master playlist"""
+        variants = []
+        bandwidth = None
+        for line in playlist.splitlines():
+            line = line.strip()
+            if line.startswith('#EXT-X-STREAM-INF'):
+                match = re.search(r'[:,]BANDWIDTH=(\d+)', line)
+                bandwidth = int(match.group(1)) if match else 0
+            elif line and not line.startswith('#') and bandwidth is not None:
+                variants.append((bandwidth, urljoin(base_url, line)))
+                bandwidth = None
+        return variants
+    
+    def _first_hls_segment(self, playlist: str, base_url: str) -> Optional[str]:
+        """Return the absolute URL of the first media segment in a media playlist"""
+        for line in playlist.splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                return urljoin(base_url, line)
+        return None
@@ -0,0 +1,260 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String,
+                        Table, inspect, text)
+
+from app import db
+
+# Ordered list of (version, description, function, on_create). Every migration
+# must be safe to run against a database that already has (part of) its
+# changes, because databases created before this module existed start at
+# version 0. Migrations flagged on_create also run on brand new databases,
+# for schema objects the models can't describe.
+MIGRATIONS = []
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def migration(version, description, on_create=False):
+    """Register a schema migration"""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn, on_create))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def run_migrations():
+    """Bring the database schema up to date"""
+    import models  # noqa: F401 - registers the tables on db.metadata
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)'
+        ))
+        current = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+
+        if current is None and not inspect(conn).has_table('search_history'):
+            # Brand new database: the models already describe the latest schema
+            db.metadata.create_all(conn)
+            for version, description, fn, on_create in MIGRATIONS:
+                if on_create:
+                    fn(conn)
+                _stamp(conn, version, description)
+            logging.info("Created database schema at version %s", MIGRATIONS[-1][0])
+            return
+
+    current = current or 0
+    for version, description, fn, _ in MIGRATIONS:
+        if version <= current:
+            continue
+        logging.info("Applying migration %s: %s", version, description)
+        with db.engine.begin() as conn:
+            fn(conn)
+            _stamp(conn, version, description)
+
+
+def _stamp(conn, version, description):
+    conn.execute(
+        text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+        {'v': version, 'd': description, 't': datetime.utcnow()}
+    )
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column):
+    """Add a model column to an existing table if it is missing"""
+    if column.name in _columns(conn, table):
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column.name} {column_type}'))
+    if column.default is not None and column.default.is_scalar:
+        conn.execute(
+            text(f'UPDATE {table} SET {column.name} = :value'),
+            {'value': column.default.arg}
+        )
+
+
+def _create_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+@migration(1, 'base tables')
+def create_base_tables(conn):
+    db.metadata.create_all(conn, tables=[
+        db.metadata.tables['search_history'],
+        db.metadata.tables['channel'],
+        db.metadata.tables['playlist_export'],
+    ])
+
+
+@migration(2, 'search_history probe progress columns')
+def add_probe_progress_columns(conn):
+    table = db.metadata.tables['search_history']
+    for name in ('tested_channels', 'working_channels', 'failed_channels', 'probe_rate',
+                 'probe_eta', 'probe_started_at', 'probe_updated_at'):
+        _add_column(conn, 'search_history', table.c[name])
+
+
+@migration(3, 'channel.is_working nullable')
+def make_is_working_nullable(conn):
+    column = next(c for c in inspect(conn).get_columns('channel') if c['name'] == 'is_working')
+    if column['nullable']:
+        return
+
+    if conn.dialect.name == 'sqlite':
+        # SQLite can't ALTER a column constraint, so rebuild the table
+        table = _channel_table_v3()
+        shared = [c for c in _columns(conn, 'channel') if c in table.c]
+        column_list = ', '.join(f'"{name}"' for name in shared)
+        conn.execute(text('ALTER TABLE channel RENAME TO channel_old'))
+        table.create(conn)
+        conn.execute(text(f'INSERT INTO channel ({column_list}) SELECT {column_list} FROM channel_old'))
+        conn.execute(text('DROP TABLE channel_old'))
+    else:
+        conn.execute(text('ALTER TABLE channel ALTER COLUMN is_working DROP NOT NULL'))
+
+
+def _channel_table_v3():
+    """The channel table as of migration 3
+
+    The rebuild must not use the current model: columns added by later
+    migrations (some of them NOT NULL) would be created empty and the copy
+    would fail. Later migrations add them with their defaults.
+    """
+    metadata = MetaData()
+    Table('search_history', metadata, Column('id', Integer, primary_key=True))
+    return Table(
+        'channel', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(200), nullable=False),
+        Column('url', String(500), nullable=False),
+        Column('category', String(100), nullable=True),
+        Column('logo', String(500), nullable=True),
+        Column('group', String(100), nullable=True),
+        Column('is_working', Boolean, nullable=True),
+        Column('search_history_id', Integer, ForeignKey('search_history.id'), nullable=False),
+        Column('last_checked', DateTime, nullable=True),
+    )
+
+
+@migration(4, 'channel url_hash and lookup indexes')
+def add_channel_indexes(conn):
+    from models import url_hash
+
+    channel = db.metadata.tables['channel']
+    _add_column(conn, 'channel', channel.c.url_hash)
+
+    # Backfill in chunks so million-row tables don't need one huge UPDATE
+    while True:
+        rows = conn.execute(
+            text('SELECT id, url FROM channel WHERE url_hash IS NULL LIMIT :limit'),
+            {'limit': BACKFILL_CHUNK_SIZE}
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            text('UPDATE channel SET url_hash = :hash WHERE id = :id'),
+            [{'id': row.id, 'hash': url_hash(row.url)} for row in rows]
+        )
+
+    _create_indexes(conn, channel)
+    _create_indexes(conn, db.metadata.tables['search_history'])
+
+
+@migration(5, 'job queue table')
+def create_job_table(conn):
+    db.metadata.tables['job'].create(conn, checkfirst=True)
+
+
+@migration(6, 'channel deep probe metrics')
+def add_channel_probe_metrics(conn):
+    channel = db.metadata.tables['channel']
+    for name in ('ttfb_ms', 'segment_kbps', 'bandwidth'):
+        _add_column(conn, 'channel', channel.c[name])
+
+
+@migration(7, 'compressed content-addressed export storage')
+def add_export_blobs(conn):
+    from playlist_export import compress_export
+
+    db.metadata.tables['export_blob'].create(conn, checkfirst=True)
+    playlist_export = db.metadata.tables['playlist_export']
+    _add_column(conn, 'playlist_export', playlist_export.c.content_hash)
+    _add_column(conn, 'playlist_export', playlist_export.c.search_history_id)
+    _create_indexes(conn, playlist_export)
+
+    # Move legacy inline bodies into blobs, one row at a time to bound memory
+    while True:
+        row = conn.execute(text(
+            "SELECT id, content FROM playlist_export "
+            "WHERE content_hash IS NULL AND content <> '' LIMIT 1"
+        )).first()
+        if row is None:
+            break
+        raw = row.content.encode('utf-8')
+        content_hash, data = compress_export(raw)
+        exists = conn.execute(
+            text('SELECT 1 FROM export_blob WHERE content_hash = :h'), {'h': content_hash}
+        ).first()
+        if not exists:
+            conn.execute(
+                text('INSERT INTO export_blob (content_hash, data, size, created_at) VALUES (:h, :d, :s, :t)'),
+                {'h': content_hash, 'd': data, 's': len(raw), 't': datetime.utcnow()}
+            )
+        conn.execute(
+            text("UPDATE playlist_export SET content = '', content_hash = :h WHERE id = :id"),
+            {'h': content_hash, 'id': row.id}
+        )
+
+
+@migration(8, 'channel probe history counters')
+def add_channel_probe_counters(conn):
+    channel = db.metadata.tables['channel']
+    for name in ('check_count', 'flip_count'):
+        _add_column(conn, 'channel', channel.c[name])
+
+
+@migration(9, 'channel listing indexes')
+def add_channel_listing_indexes(conn):
+    _create_indexes(conn, db.metadata.tables['channel'])
+
+
+@migration(10, 'channel full-text search index', on_create=True)
+def add_channel_fts(conn):
+    from channel_search import install_fts
+    install_fts(conn)
+
+
+@migration(11, 'server-side parsed viewer playlists')
+def create_viewer_tables(conn):
+    db.metadata.tables['viewer_playlist'].create(conn, checkfirst=True)
+    db.metadata.tables['viewer_entry'].create(conn, checkfirst=True)
+
+
+@migration(12, 'job lanes and retry delay')
+def add_job_lanes(conn):
+    job = db.metadata.tables['job']
+    for name in ('lane', 'run_after'):
+        _add_column(conn, 'job', job.c[name])
+    _create_indexes(conn, job)
+
+
+@migration(13, 'unique pending periodic job')
+def add_periodic_job_guard(conn):
+    _create_indexes(conn, db.metadata.tables['job'])
+
+
+@migration(14, 'viewer playlist retention')
+def add_viewer_retention_columns(conn):
+    viewer_playlist = db.metadata.tables['viewer_playlist']
+    for name in ('last_used_at', 'pinned'):
+        _add_column(conn, 'viewer_playlist', viewer_playlist.c[name])
+    conn.execute(text('UPDATE viewer_playlist SET last_used_at = created_at WHERE last_used_at IS NULL'))
+    _create_indexes(conn, viewer_playlist)
@@ -1,7 +1,10 @@
+import hashlib
 from app import db
 from datetime import datetime
+from typing import Optional
+from probe_cache import normalize_url
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Text, Integer, DateTime, Boolean
+from sqlalchemy import String, Text, Integer, DateTime, Boolean, Float, LargeBinary
 
 class SearchHistory(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -9,24 +12,117 @@ class SearchHistory(db.Model):
     title: Mapped[str] = mapped_column(String(200), nullable=True)
     channels_found: Mapped[int] = mapped_column(Integer, default=0)
     valid_channels: Mapped[int] = mapped_column(Integer, default=0)
-    search_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    search_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     status: Mapped[str] = mapped_column(String(50), default='pending')
+    # Live channel probing progress, updated once per result batch
+    tested_channels: Mapped[int] = mapped_column(Integer, default=0)
+    working_channels: Mapped[int] = mapped_column(Integer, default=0)
+    failed_channels: Mapped[int] = mapped_column(Integer, default=0)
+    probe_rate: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    probe_eta: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    probe_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    probe_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
+def url_hash(url: str) -> str:
+    """Fixed-width lookup key for a channel URL"""
+    return hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
 class Channel(db.Model):
+    __table_args__ = (
+        db.Index('ix_channel_search_working', 'search_history_id', 'is_working'),
+        db.Index('ix_channel_search_category', 'search_history_id', 'category'),
+        db.Index('ix_channel_search_name', 'search_history_id', 'name'),
+    )
+    
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     url: Mapped[str] = mapped_column(String(500), nullable=False)
+    url_hash: Mapped[Optional[str]] = mapped_column(String(40), nullable=True, index=True)
     category: Mapped[str] = mapped_column(String(100), nullable=True)
     logo: Mapped[str] = mapped_column(String(500), nullable=True)
     group: Mapped[str] = mapped_column(String(100), nullable=True)
-    is_working: Mapped[bool] = mapped_column(Boolean, default=None)
+    is_working: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True, default=None)
     search_history_id: Mapped[int] = mapped_column(Integer, db.ForeignKey('search_history.id'), nullable=False)
-    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    # Probe history used to prioritize re-validation of flaky channels
+    check_count: Mapped[int] = mapped_column(Integer, default=0)
+    flip_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Deep (HLS) probe metrics; NULL when only a basic probe was run
+    ttfb_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    segment_kbps: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    bandwidth: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+class ExportBlob(db.Model):
+    """Gzip-compressed export or offline HTML body, stored once per distinct content"""
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class PlaylistExport(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     filename: Mapped[str] = mapped_column(String(200), nullable=False)
-    content: Mapped[str] = mapped_column(Text, nullable=False)
+    # Legacy inline body; new exports keep it empty and point at an ExportBlob
+    content: Mapped[str] = mapped_column(Text, nullable=False, default='')
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), db.ForeignKey('export_blob.content_hash'), nullable=True, index=True)
+    search_history_id: Mapped[Optional[int]] = mapped_column(Integer, db.ForeignKey('search_history.id'), nullable=True, index=True)
     channels_count: Mapped[int] = mapped_column(Integer, default=0)
     export_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     export_type: Mapped[str] = mapped_column(String(50), default='m3u')
+
+PENDING_PERIODIC_JOB = "lane = 'periodic' AND status IN ('queued', 'running')"
+
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+        db.Index('ix_job_status_lane_id', 'status', 'lane', 'id'),
+        # At most one pending job per periodic kind, however many workers enqueue it
+        db.Index('ux_job_pending_periodic', 'kind', unique=True,
+                 sqlite_where=db.text(PENDING_PERIODIC_JOB),
+                 postgresql_where=db.text(PENDING_PERIODIC_JOB)),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
+    status: Mapped[str] = mapped_column(String(20), default='queued')
+    # Each lane is served by its own worker, so short jobs never wait behind long ones
+    lane: Mapped[str] = mapped_column(String(20), default='default')
+    # A failed job is retried, but not before this time
+    run_after: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    search_history_id: Mapped[Optional[int]] = mapped_column(Integer, db.ForeignKey('search_history.id'), nullable=True)
+    checkpoint: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    worker: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+class ViewerPlaylist(db.Model):
+    """Playlist opened in the M3U viewer, parsed once on the server"""
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    filename: Mapped[str] = mapped_column(String(200), nullable=False)
+    title: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    # SHA-256 of the uploaded bytes, so identical files are parsed only once
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    entries_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Also bumped when the same file is imported again; retention counts from here
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    # Pinned playlists (the demo) are never removed by retention
+    pinned: Mapped[bool] = mapped_column(Boolean, default=False)
+
+class ViewerEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_viewer_entry_playlist_id', 'playlist_id', 'id'),
+        db.Index('ix_viewer_entry_playlist_category', 'playlist_id', 'category'),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    playlist_id: Mapped[int] = mapped_column(Integer, db.ForeignKey('viewer_playlist.id'), nullable=False)
+    name: Mapped[str] = mapped_column(Text, nullable=False, default='')
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    logo: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    category: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
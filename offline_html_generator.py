@@ -1,22 +1,124 @@
-def generate_offline_html(m3u_content):
-    """Generate complete offline HTML with all dependencies embedded"""
-    
-    # FontAwesome icons as Unicode
-    icon_mappings = {
-        'fas fa-film': '🎬',
-        'fas fa-th': '⊞',
-        'fas fa-list': '☰',
-        'fas fa-download': '⬇',
-        'fas fa-code': '⌨',
-        'fas fa-search': '🔍',
-        'fas fa-info-circle': 'ℹ',
-        'fas fa-play': '▶',
-        'fas fa-copy': '📋',
-        'fas fa-check-circle': '✓',
-        'fas fa-times': '✕'
+import base64
+import hashlib
+import json
+import os
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+
+_STATIC_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'js')
+
+
+def _read_script(filename):
+    with open(os.path.join(_STATIC_JS, filename), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+# Shared with the M3U viewer page; inlined so the offline file stays self-contained
+VIRTUAL_GRID_JS = _read_script('virtual_grid.js')
+PLAYLIST_WORKER_JS = _read_script('offline_playlist_worker.js')
+
+# Bumped whenever build_payload's format changes
+PAYLOAD_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+
+def build_payload(entries: Iterable[Tuple[str, str, Optional[str], Optional[str]]]) -> Dict:
+    """Pack (name, url, logo, category) entries into columns for the offline page
+
+    Categories and logo URL prefixes repeat across most of a playlist, so each
+    distinct value is stored once and the entries refer to it by index.
+    """
+    categories, category_ids = [], {}
+    logo_prefixes, logo_prefix_ids = [], {}
+    names, urls, category_column, logo_prefix_column, logo_column = [], [], [], [], []
+
+    for name, url, logo, category in entries:
+        category = category or ''
+        category_id = category_ids.get(category)
+        if category_id is None:
+            category_id = category_ids[category] = len(categories)
+            categories.append(category)
+
+        head, slash, tail = (logo or '').rpartition('/')
+        prefix = head + slash
+        prefix_id = logo_prefix_ids.get(prefix)
+        if prefix_id is None:
+            prefix_id = logo_prefix_ids[prefix] = len(logo_prefixes)
+            logo_prefixes.append(prefix)
+
+        names.append(name or '')
+        urls.append(url)
+        category_column.append(category_id)
+        logo_prefix_column.append(prefix_id)
+        logo_column.append(tail)
+
+    return {
+        'version': PAYLOAD_VERSION,
+        'categories': categories,
+        'logoPrefixes': logo_prefixes,
+        'names': names,
+        'urls': urls,
+        'category': category_column,
+        'logoPrefix': logo_prefix_column,
+        'logo': logo_column,
     }
-    
-    html_template = '''<!DOCTYPE html>
+
+
+def _iter_json(payload: Dict, batch_size: int = 10000) -> Iterator[str]:
+    """Serialize a payload in pieces; large columns are encoded a slice at a time"""
+    yield '{'
+    for position, (key, value) in enumerate(payload.items()):
+        yield (',' if position else '') + json.dumps(key) + ':'
+        if not isinstance(value, list):
+            yield json.dumps(value, ensure_ascii=False)
+            continue
+        yield '['
+        for start in range(0, len(value), batch_size):
+            items = json.dumps(value[start:start + batch_size], ensure_ascii=False, separators=(',', ':'))
+            yield (',' if start else '') + items[1:-1]
+        yield ']'
+    yield '}'
+
+
+def iter_encoded_payload(payload: Dict, compress: bool = False) -> Iterator[str]:
+    """Yield the payload as text for its <script> element, piece by piece"""
+    if not compress:
+        for piece in _iter_json(payload):
+            # "<" only occurs inside JSON strings, where \u003c is equivalent
+            # and can't close the script element
+            yield piece.replace('<', '\\u003c')
+        return
+
+    # wbits=31 writes a gzip container with mtime 0, so identical playlists
+    # produce identical pages
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+    pending = b''
+    for piece in _iter_json(payload):
+        pending += compressor.compress(piece.encode('utf-8'))
+        # Base64 whole 3-byte groups so the encoded pieces concatenate cleanly
+        usable = len(pending) - len(pending) % 3
+        if usable:
+            yield base64.b64encode(pending[:usable]).decode('ascii')
+            pending = pending[usable:]
+    pending += compressor.flush()
+    yield base64.b64encode(pending).decode('ascii')
+
+
+def iter_offline_html(entries, compress=False) -> Iterator[str]:
+    """Yield the offline page for (name, url, logo, category) entries in pieces
+
+    The static parts of the page are prepared once at import, so a page is
+    never assembled as a whole in memory.
+    """
+    yield _PAGE_HEAD
+    yield 'application/gzip+base64' if compress else 'application/json'
+    yield _PAGE_MIDDLE
+    yield from iter_encoded_payload(build_payload(entries), compress)
+    yield _PAGE_TAIL
+
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
 <html lang="pt-BR">
 <head>
     <meta charset="UTF-8">
@@ -432,7 +534,7 @@ def generate_offline_html(m3u_content):
                                     🔍
                                 </span>
                                 <input type="text" class="form-control" id="searchInput" 
-                                       placeholder="Buscar filmes..." onkeyup="filterMovies()">
+                                       placeholder="Buscar filmes..." oninput="filterMovies()">
                             </div>
                         </div>
                         <div class="col-md-6 mb-3">
@@ -525,89 +627,99 @@ def generate_offline_html(m3u_content):
         </div>
     </div>
 
+    <script>{VIRTUAL_GRID_JS}</script>
+    <script id="playlistWorkerSource" type="javascript/worker">{PLAYLIST_WORKER_JS}</script>
+    <!-- Playlist parsed on the server, as columnar JSON (see build_payload) -->
+    <script id="playlistData" type="{PAYLOAD_TYPE}">{PAYLOAD}</script>
     <script>
         // Global variables
-        let allMovies = [];
-        let filteredMovies = [];
-        let categories = new Set();
+        // Decoded entries, as parallel arrays (see offline_playlist_worker.js)
+        let movies = { names: [], logos: [], categories: [], urls: [] };
+        let categoryList = [];
+        // Indices into `movies` of the entries matching the current filters
+        let filteredIndices = new Int32Array(0);
         let currentGridView = 'grid';
-        
-        // M3U content embedded in the file
-        const m3uContent = `{M3U_CONTENT}`;
+        let playlistWorker = null;
+        let loaded = false;
+        let filterTimer = null;
+        let filterRequest = 0;
+        let grid = null;
         
         // Initialize the application
         document.addEventListener('DOMContentLoaded', function() {
-            parseM3UContent();
+            grid = new VirtualGrid(document.getElementById('movieGrid'), {
+                rowHeight: 400,
+                minColumnWidth: 280,
+                renderItem: position => createMovieCard(filteredIndices[position])
+            });
             setupEventListeners();
+            startWorker();
         });
         
-        function parseM3UContent() {
-            const lines = m3uContent.split('\\n');
-            let currentMovie = null;
-            let processed = 0;
-            
-            for (let i = 0; i < lines.length; i++) {
-                const line = lines[i].trim();
-                
-                if (line.startsWith('#EXTINF:')) {
-                    currentMovie = parseExtinf(line);
-                } else if (line && !line.startsWith('#') && currentMovie) {
-                    currentMovie.url = line;
-                    allMovies.push(currentMovie);
-                    categories.add(currentMovie.category || 'Sem Categoria');
-                    currentMovie = null;
-                }
-                
-                // Update progress
-                processed++;
-                const progress = Math.round((processed / lines.length) * 100);
-                document.getElementById('loadingProgress').textContent = progress + '%';
+        function startWorker() {
+            // Decoding runs in a worker built from the embedded source, so the
+            // page stays responsive while large playlists load
+            const source = document.getElementById('playlistWorkerSource').textContent;
+            try {
+                const workerUrl = URL.createObjectURL(new Blob([source], { type: 'text/javascript' }));
+                playlistWorker = new Worker(workerUrl);
+                playlistWorker.onmessage = onWorkerMessage;
+                playlistWorker.onerror = function(e) {
+                    // e.g. workers blocked for file:// pages
+                    if (loaded) return;
+                    e.preventDefault();
+                    useMainThreadWorker(source);
+                };
+            } catch (e) {
+                useMainThreadWorker(source);
+                return;
             }
-            
-            filteredMovies = [...allMovies];
-            updateUI();
-            hideLoading();
+            loadPlaylist();
         }
         
-        function parseExtinf(line) {
-            const movie = {
-                name: '',
-                logo: '',
-                category: '',
-                url: ''
+        function useMainThreadWorker(source) {
+            (0, eval)(source);
+            playlistWorker = {
+                postMessage: data => setTimeout(() => handleMessage(data, message => onWorkerMessage({ data: message })))
             };
-            
-            // Extract name (after last comma)
-            const nameMatch = line.match(/,(.+)$/);
-            if (nameMatch) {
-                movie.name = nameMatch[1].trim();
-            }
-            
-            // Extract logo
-            const logoMatch = line.match(/tvg-logo="([^"]+)"/);
-            if (logoMatch) {
-                movie.logo = logoMatch[1];
-            }
-            
-            // Extract category
-            const categoryMatch = line.match(/group-title="([^"]+)"/);
-            if (categoryMatch) {
-                movie.category = categoryMatch[1];
+            loadPlaylist();
+        }
+        
+        function loadPlaylist() {
+            const payload = document.getElementById('playlistData');
+            playlistWorker.postMessage({ type: 'load', payloadType: payload.type, text: payload.textContent });
+        }
+        
+        function onWorkerMessage(e) {
+            const data = e.data;
+            if (data.type === 'loaded') {
+                loaded = true;
+                movies = data;
+                categoryList = data.categoryList;
+                filteredIndices = Int32Array.from(data.names.keys());
+                updateCategoryFilter();
+                hideLoading();
+                updateStats();
+                renderMovies();
+            } else if (data.type === 'failed') {
+                document.getElementById('loadingIndicator').textContent = 'Erro ao carregar a lista: ' + data.message;
+            } else if (data.type === 'filtered' && data.id === filterRequest) {
+                filteredIndices = data.indices;
+                updateStats();
+                renderMovies();
             }
-            
-            return movie;
         }
         
-        function updateUI() {
-            updateStats();
-            updateCategoryFilter();
-            renderMovies();
+        function escapeHtml(value) {
+            return String(value === null || value === undefined ? '' : value)
+                .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+                .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
         }
         
         function updateStats() {
-            document.getElementById('totalMovies').textContent = allMovies.length;
-            document.getElementById('visibleMovies').textContent = filteredMovies.length;
-            document.getElementById('totalCategories').textContent = categories.size;
+            document.getElementById('totalMovies').textContent = movies.names.length;
+            document.getElementById('visibleMovies').textContent = filteredIndices.length;
+            document.getElementById('totalCategories').textContent = categoryList.length;
             document.getElementById('loadingProgress').textContent = '100%';
         }
         
@@ -615,7 +727,7 @@ def generate_offline_html(m3u_content):
             const categoryFilter = document.getElementById('categoryFilter');
             categoryFilter.innerHTML = '<option value="">Todas as Categorias</option>';
             
-            Array.from(categories).sort().forEach(category => {
+            categoryList.forEach(category => {
                 const option = document.createElement('option');
                 option.value = category;
                 option.textContent = category;
@@ -627,7 +739,7 @@ def generate_offline_html(m3u_content):
             const movieGrid = document.getElementById('movieGrid');
             const noResults = document.getElementById('noResults');
             
-            if (filteredMovies.length === 0) {
+            if (filteredIndices.length === 0) {
                 movieGrid.style.display = 'none';
                 noResults.style.display = 'block';
                 return;
@@ -635,72 +747,68 @@ def generate_offline_html(m3u_content):
             
             movieGrid.style.display = 'grid';
             noResults.style.display = 'none';
-            movieGrid.innerHTML = '';
-            
-            filteredMovies.forEach((movie, index) => {
-                const movieCard = createMovieCard(movie, index);
-                movieGrid.appendChild(movieCard);
-            });
-        }
-        
-        function createMovieCard(movie, index) {
-            const card = document.createElement('div');
-            card.className = 'movie-card';
-            card.innerHTML = `
-                <div class="movie-poster">
-                    ${movie.logo ? 
-                        `<img src="${movie.logo}" alt="${movie.name}" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
-                         <div class="no-image" style="display: none;">
-                             🎬
-                         </div>` :
-                        `<div class="no-image">
-                             🎬
-                         </div>`
-                    }
-                    <div class="category-badge">${movie.category || 'Sem Categoria'}</div>
-                </div>
-                <div class="movie-info">
-                    <div class="movie-title">${movie.name}</div>
-                    <div class="movie-actions">
-                        <button class="btn btn-sm btn-primary" onclick="showMovieDetails(${index})">
-                            ℹ
-                        </button>
-                        <button class="btn btn-sm btn-success" onclick="playMovie('${movie.url}')">
-                            ▶
-                        </button>
-                        <button class="btn btn-sm btn-outline-secondary" onclick="copyMovieUrl('${movie.url}')">
-                            📋
-                        </button>
+            // Only the cards in view are created; the grid renders the rest on scroll
+            grid.setCount(filteredIndices.length);
+        }
+        
+        function createMovieCard(index) {
+            const name = escapeHtml(movies.names[index]);
+            const logo = movies.logos[index];
+            return `
+                <div class="movie-card">
+                    <div class="movie-poster">
+                        ${logo ? 
+                            `<img src="${escapeHtml(logo)}" alt="${name}" loading="lazy" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
+                             <div class="no-image" style="display: none;">
+                                 🎬
+                             </div>` :
+                            `<div class="no-image">
+                                 🎬
+                             </div>`
+                        }
+                        <div class="category-badge">${escapeHtml(movies.categories[index] || 'Sem Categoria')}</div>
+                    </div>
+                    <div class="movie-info">
+                        <div class="movie-title">${name}</div>
+                        <div class="movie-actions">
+                            <button class="btn btn-sm btn-primary" onclick="showMovieDetails(${index})">
+                                ℹ
+                            </button>
+                            <button class="btn btn-sm btn-success" onclick="playMovie(${index})">
+                                ▶
+                            </button>
+                            <button class="btn btn-sm btn-outline-secondary" onclick="copyMovieUrl(${index})">
+                                📋
+                            </button>
+                        </div>
                     </div>
                 </div>
             `;
-            
-            return card;
         }
         
         function filterMovies() {
-            const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-            const categoryFilter = document.getElementById('categoryFilter').value;
-            
-            filteredMovies = allMovies.filter(movie => {
-                const matchesSearch = movie.name.toLowerCase().includes(searchTerm);
-                const matchesCategory = !categoryFilter || movie.category === categoryFilter;
-                return matchesSearch && matchesCategory;
-            });
-            
-            renderMovies();
-            updateStats();
+            // Debounced; the worker matches against its lowercase name index
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(() => {
+                if (!loaded) return;
+                filterRequest++;
+                playlistWorker.postMessage({
+                    type: 'filter',
+                    id: filterRequest,
+                    term: document.getElementById('searchInput').value.toLowerCase(),
+                    category: document.getElementById('categoryFilter').value
+                });
+            }, 200);
         }
         
         function showMovieDetails(index) {
-            const movie = filteredMovies[index];
-            document.getElementById('modalTitle').textContent = movie.name;
-            document.getElementById('modalCategory').textContent = movie.category || 'Sem Categoria';
-            document.getElementById('modalUrl').value = movie.url;
-            document.getElementById('modalPlayButton').href = movie.url;
+            document.getElementById('modalTitle').textContent = movies.names[index];
+            document.getElementById('modalCategory').textContent = movies.categories[index] || 'Sem Categoria';
+            document.getElementById('modalUrl').value = movies.urls[index];
+            document.getElementById('modalPlayButton').href = movies.urls[index];
             
-            if (movie.logo) {
-                document.getElementById('modalPoster').src = movie.logo;
+            if (movies.logos[index]) {
+                document.getElementById('modalPoster').src = movies.logos[index];
             }
             
             document.getElementById('movieModal').classList.add('show');
@@ -710,12 +818,12 @@ def generate_offline_html(m3u_content):
             document.getElementById('movieModal').classList.remove('show');
         }
         
-        function playMovie(url) {
-            window.open(url, '_blank');
+        function playMovie(index) {
+            window.open(movies.urls[index], '_blank');
         }
         
-        function copyMovieUrl(url) {
-            navigator.clipboard.writeText(url).then(() => {
+        function copyMovieUrl(index) {
+            navigator.clipboard.writeText(movies.urls[index]).then(() => {
                 showToast('URL copiada!', 'A URL do filme foi copiada para a área de transferência.');
             });
         }
@@ -747,27 +855,26 @@ def generate_offline_html(m3u_content):
         }
         
         function generateM3UContent() {
-            let content = '#EXTM3U\\n';
-            filteredMovies.forEach(movie => {
-                content += `#EXTINF:-1 tvg-name="${movie.name}"`;
-                if (movie.logo) content += ` tvg-logo="${movie.logo}"`;
-                if (movie.category) content += ` group-title="${movie.category}"`;
-                content += `,${movie.name}\\n`;
-                content += `${movie.url}\\n`;
+            const lines = ['#EXTM3U'];
+            filteredIndices.forEach(index => {
+                const name = movies.names[index];
+                let entry = `#EXTINF:-1 tvg-name="${name}"`;
+                if (movies.logos[index]) entry += ` tvg-logo="${movies.logos[index]}"`;
+                if (movies.categories[index]) entry += ` group-title="${movies.categories[index]}"`;
+                lines.push(`${entry},${name}`, movies.urls[index]);
             });
-            return content;
+            return lines.join('\\n') + '\\n';
         }
         
         function toggleGridView() {
-            const movieGrid = document.getElementById('movieGrid');
             const viewIcon = document.getElementById('view-icon');
             
             if (currentGridView === 'grid') {
-                movieGrid.style.gridTemplateColumns = 'repeat(auto-fill, minmax(200px, 1fr))';
+                grid.setMinColumnWidth(200);
                 viewIcon.textContent = '☰';
                 currentGridView = 'compact';
             } else {
-                movieGrid.style.gridTemplateColumns = 'repeat(auto-fill, minmax(280px, 1fr))';
+                grid.setMinColumnWidth(280);
                 viewIcon.textContent = '⊞';
                 currentGridView = 'grid';
             }
@@ -811,7 +918,22 @@ def generate_offline_html(m3u_content):
     </script>
 </body>
 </html>'''
-    
-    # Replace the M3U content placeholder
-    escaped_content = m3u_content.replace('`', '\\`').replace('\\', '\\\\')
-    return html_template.replace('{M3U_CONTENT}', escaped_content)
\ No newline at end of file
+
+
+def _split_template() -> Tuple[str, str, str]:
+    page = (PAGE_TEMPLATE
+            .replace('{VIRTUAL_GRID_JS}', VIRTUAL_GRID_JS)
+            .replace('{PLAYLIST_WORKER_JS}', PLAYLIST_WORKER_JS))
+    head, rest = page.split('{PAYLOAD_TYPE}')
+    middle, tail = rest.split('{PAYLOAD}')
+    return head, middle, tail
+
+
+# The page around the payload's script type and the payload itself
+_PAGE_HEAD, _PAGE_MIDDLE, _PAGE_TAIL = _split_template()
+
+# Identifies the page layout, scripts and payload format; cached pages built
+# by another version of this module are not reused
+PAGE_VERSION = hashlib.sha256(
+    f'{PAYLOAD_VERSION}:{_PAGE_HEAD}{_PAGE_MIDDLE}{_PAGE_TAIL}'.encode('utf-8')
+).hexdigest()[:16]
@@ -0,0 +1,151 @@
+import itertools
+import logging
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, IO, Iterable, Iterator, List, Optional, Set, Tuple
+
+from host_scheduler import HostScheduler
+from m3u_validator import M3UValidator
+from probe_cache import normalize_url
+from web_scraper import find_m3u_links
+
+# Downloaded playlists stay in memory up to this size, then spill to disk
+SPOOL_BYTES = 4 * 1024 * 1024
+
+
+class PlaylistCrawler:
+    """Find the playlists linked from a page and download them in parallel
+
+    The start URL is fetched first: if it is a playlist itself it is the only
+    one yielded. Otherwise every playlist link on the page is fetched by a
+    bounded thread pool, with at most `per_host_concurrency` downloads per
+    host started at least `per_host_interval` seconds apart. Playlists are
+    downloaded to spooled temporary files and yielded as they complete;
+    links that turn out to be web pages are searched for more links while
+    they are within `max_depth` hops of the start page. Links inside a
+    playlist are channels and are never followed. Each URL is fetched at
+    most once per crawl.
+    """
+
+    def __init__(self, make_validator: Callable[[], M3UValidator], max_depth: int = 2,
+                 max_workers: int = 8, max_links: int = 200,
+                 per_host_concurrency: int = 2, per_host_interval: float = 0.25):
+        self.make_validator = make_validator
+        self.max_depth = max_depth
+        self.max_workers = max(1, max_workers)
+        self.max_links = max_links
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+
+    def crawl(self, start_url: str, skip: Iterable[str] = ()) -> Iterator[Tuple[str, IO[str]]]:
+        """Yield (playlist URL, playlist body as a text file opened at its start)
+
+        URLs in `skip` are treated as already fetched. The caller owns, and
+        must close, every yielded file.
+        """
+        seen = {normalize_url(url) for url in skip}
+        if normalize_url(start_url) in seen:
+            return
+        seen.add(normalize_url(start_url))
+
+        try:
+            body, links = self._fetch(start_url, True)
+        except Exception as e:
+            logging.warning(f"Error crawling {start_url}: {e}")
+            return
+        if body is not None:
+            # A playlist URL without a playlist extension
+            yield start_url, body
+            return
+
+        scheduler = HostScheduler(
+            per_host_concurrency=self.per_host_concurrency,
+            min_interval=self.per_host_interval
+        )
+        for link in self._new_links(links, seen):
+            scheduler.add(link, (link, 1))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='crawler') as pool:
+            running = {}
+            try:
+                while scheduler.pending or running:
+                    # Only max_workers downloads are in flight (or waiting to be
+                    # consumed) at a time, which bounds memory and disk use
+                    delay = None
+                    while len(running) < self.max_workers:
+                        ready, delay = scheduler.next_ready()
+                        if ready is None:
+                            break
+                        host, (link, depth) = ready
+                        running[pool.submit(self._fetch, link, depth < self.max_depth)] = (host, link, depth)
+
+                    if not running:
+                        # Every remaining host is inside its politeness interval
+                        time.sleep(delay or 0)
+                        continue
+
+                    done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        host, link, depth = running.pop(future)
+                        scheduler.release(host)
+                        try:
+                            body, links = future.result()
+                        except Exception as e:
+                            logging.warning(f"Error crawling {link}: {e}")
+                            continue
+                        if body is not None:
+                            yield link, body
+                        for child in self._new_links(links, seen):
+                            scheduler.add(child, (child, depth + 1))
+            finally:
+                # Stopped early: discard downloads nobody will read
+                for future in running:
+                    future.cancel()
+                for future in running:
+                    if not future.cancelled() and future.exception() is None:
+                        body, _ = future.result()
+                        if body is not None:
+                            body.close()
+
+    def _new_links(self, links: Iterable[str], seen: Set[str]) -> List[str]:
+        new = []
+        for link in links:
+            key = normalize_url(link)
+            if key in seen or len(seen) >= self.max_links:
+                continue
+            seen.add(key)
+            new.append(link)
+        return new
+
+    def _fetch(self, url: str, follow: bool) -> Tuple[Optional[IO[str]], List[str]]:
+        """Download `url`: a playlist yields its body, a page (when followed) its links"""
+        lines = self.make_validator().open_m3u_stream(url)
+        if lines is None:
+            return None, []
+
+        first_line = next((line.strip() for line in lines if line.strip()), '')
+        if not first_line.startswith('#EXTM3U'):
+            if not follow:
+                lines.close()
+                return None, []
+            # Not a playlist; it may be a page listing more of them. The rest
+            # of the download is scanned as it arrives instead of fetched again.
+            page = itertools.chain([first_line], lines)
+            return None, find_m3u_links((line + '\n' for line in page), url)
+
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode='w+', encoding='utf-8')
+        try:
+            body.write(first_line + '\n')
+            for line in lines:
+                if line.startswith('#EXT-X-'):
+                    # An HLS stream, i.e. a channel rather than a channel list
+                    lines.close()
+                    body.close()
+                    return None, []
+                body.write(line + '\n')
+        except BaseException:
+            body.close()
+            raise
+        body.seek(0)
+        return body, []
@@ -0,0 +1,114 @@
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import Channel, ExportBlob, PlaylistExport
+
+COMPRESSION_LEVEL = 6
+
+
+def iter_m3u_chunks(search_id: int, batch_size: int = 1000) -> Iterator[bytes]:
+    """Yield the working channels of a search as encoded M3U, one batch per chunk"""
+    yield b'#EXTM3U\n'
+
+    rows = db.session.execute(
+        select(Channel.name, Channel.logo, Channel.category, Channel.url)
+        .where(Channel.search_history_id == search_id, Channel.is_working.is_(True))
+        .order_by(Channel.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in rows.partitions():
+        lines = []
+        for name, logo, category, url in partition:
+            entry = f'#EXTINF:-1 tvg-name="{name}"'
+            if logo:
+                entry += f' tvg-logo="{logo}"'
+            if category:
+                entry += f' group-title="{category}"'
+            lines.append(f'{entry},{name}\n{url}\n')
+        yield ''.join(lines).encode('utf-8')
+
+
+class ExportCompressor:
+    """Incrementally gzip and hash an export while it is being streamed"""
+
+    def __init__(self):
+        # wbits=31 writes a gzip container with mtime 0, so identical bodies
+        # compress to identical bytes and can be served as-is
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        self._hash = hashlib.sha256()
+        self._parts = []
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        compressed = self._compressor.compress(chunk)
+        if compressed:
+            self._parts.append(compressed)
+
+    def finish(self):
+        """Return (content_hash, gzip_bytes)"""
+        self._parts.append(self._compressor.flush())
+        return self._hash.hexdigest(), b''.join(self._parts)
+
+
+def compress_export(raw: bytes):
+    """Return (content_hash, gzip_bytes) for a complete export body"""
+    compressor = ExportCompressor()
+    compressor.write(raw)
+    return compressor.finish()
+
+
+def store_blob(content_hash: str, data: bytes, size: int) -> None:
+    """Store a compressed export body unless identical content is already stored"""
+    if db.session.get(ExportBlob, content_hash) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ExportBlob(
+                content_hash=content_hash, data=data, size=size, created_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        # Stored concurrently by another request; that copy is identical
+        pass
+
+
+def stream_export(search_id: int, filename: str, channels_count: int) -> Iterator[bytes]:
+    """Stream an export to the client and store the same bytes, compressed, as a PlaylistExport"""
+    compressor = ExportCompressor()
+    for chunk in iter_m3u_chunks(search_id, app.config['EXPORT_BATCH_SIZE']):
+        compressor.write(chunk)
+        yield chunk
+
+    # Only fully delivered exports are recorded
+    content_hash, data = compressor.finish()
+    store_blob(content_hash, data, compressor.size)
+    export = PlaylistExport(
+        filename=filename,
+        content='',
+        content_hash=content_hash,
+        search_history_id=search_id,
+        channels_count=channels_count,
+        export_date=datetime.utcnow(),
+        export_type='m3u'
+    )
+    db.session.add(export)
+    db.session.commit()
+
+
+def iter_gunzip(data: bytes, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Decompress a stored export in chunks for clients without gzip support"""
+    decompressor = zlib.decompressobj(31)
+    for offset in range(0, len(data), chunk_size):
+        chunk = decompressor.decompress(data[offset:offset + chunk_size])
+        if chunk:
+            yield chunk
+    tail = decompressor.flush()
+    if tail:
+        yield tail
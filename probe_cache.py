@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a stream URL so equivalent spellings share one cache key"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    if parts.username or parts.password:
+        userinfo = parts.username or ''
+        if parts.password:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    # Fragments never reach the server, so they can't change the result
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+class ProbeCache:
+    """Thread-safe, size-bounded LRU cache of stream probe results with a TTL"""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached result for `url`, or None if missing or expired"""
+        if self.ttl <= 0:
+            return None
+
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, url: str, is_working: bool, checked_at: datetime, latency: Optional[float] = None,
+            metrics: Optional[Dict] = None) -> None:
+        """Store a probe result, evicting the least recently used entries"""
+        if self.ttl <= 0:
+            return
+
+        key = normalize_url(url)
+        entry = {
+            'is_working': is_working,
+            'checked_at': checked_at,
+            'latency': latency,
+            'metrics': metrics,
+            'stored_at': time.monotonic()
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, select
+
+from app import db
+from models import Channel, PlaylistExport
+
+
+def select_stale_channels(older_than: timedelta, limit: int,
+                          flakiness_weight: float = 5.0, export_weight: float = 2.0) -> List:
+    """Pick channels due for re-validation, most important first.
+
+    A channel is stale once its last check is older than `older_than`.
+    Channels that changed status often (flip_count) and channels from
+    searches that get exported a lot come first; ties go to the oldest check.
+    """
+    cutoff = datetime.utcnow() - older_than
+
+    exports = (
+        select(PlaylistExport.search_history_id, func.count().label('export_count'))
+        .where(PlaylistExport.search_history_id.isnot(None))
+        .group_by(PlaylistExport.search_history_id)
+        .subquery()
+    )
+    score = (
+        func.coalesce(Channel.flip_count, 0) * flakiness_weight
+        + func.coalesce(exports.c.export_count, 0) * export_weight
+    )
+
+    return db.session.execute(
+        select(Channel.id, Channel.url, Channel.search_history_id)
+        .outerjoin(exports, exports.c.search_history_id == Channel.search_history_id)
+        .where(Channel.last_checked < cutoff)
+        .order_by(score.desc(), Channel.last_checked.asc())
+        .limit(limit)
+    ).all()
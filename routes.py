@@ -1,15 +1,68 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash, send_file
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context
 from app import app, db
-from models import SearchHistory, Channel, PlaylistExport
+from models import SearchHistory, Channel, PlaylistExport, ExportBlob, ViewerPlaylist, url_hash
 from m3u_validator import M3UValidator
 from web_scraper import get_website_text_content
-from offline_html_generator import generate_offline_html
-from datetime import datetime
-import re
+from channel_prober import ChannelProber
+from playlist_export import stream_export, iter_gunzip
+from channel_categorizer import ChannelCategorizer, load_category_rules
+from probe_cache import ProbeCache
+from http_cache import HTTPCache
+from http_client import configure_shared_client, shared_client
+from playlist_crawler import PlaylistCrawler
+from job_queue import INTERACTIVE_LANE, enqueue, job_handler, schedule_periodic
+from revalidation import select_stale_channels
+from channel_listing import SORTS, DEFAULT_SORT, UNCATEGORIZED, list_channels, category_counts
+from channel_search import index_channels, search_channels as search_channel_index
+from viewer_playlists import (import_playlist, list_entries, count_entries, entry_categories,
+                              iter_m3u as iter_viewer_m3u, cached_offline_html, stream_offline_html,
+                              delete_expired_playlists)
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import OperationalError
+from datetime import datetime, timedelta
+import hashlib
 import io
-import threading
-import time
+import itertools
 import os
+import requests
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+# Keyword rules used to fill in missing channel categories on ingest
+channel_categorizer = ChannelCategorizer(
+    load_category_rules(app.config['CATEGORY_RULES_FILE']) if app.config['CATEGORY_RULES_FILE'] else None
+)
+
+HISTORY_PAGE_SIZE = 25
+
+# Playlist processing errors worth retrying; any other error is final
+TRANSIENT_ERRORS = (requests.exceptions.RequestException, OperationalError)
+
+# Connection pools, DNS cache and retry/timeout policy for all outgoing requests
+configure_shared_client(
+    pool_connections=app.config['HTTP_POOL_CONNECTIONS'],
+    pool_maxsize=app.config['HTTP_POOL_MAXSIZE'],
+    retries=app.config['HTTP_RETRIES'],
+    backoff_factor=app.config['HTTP_RETRY_BACKOFF'],
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['HTTP_READ_TIMEOUT'],
+    probe_timeout=app.config['HTTP_PROBE_TIMEOUT'],
+    dns_cache_ttl=app.config['HTTP_DNS_CACHE_TTL']
+)
+
+# Probe results shared by every search handled in this process
+probe_cache = ProbeCache(
+    ttl=app.config['PROBE_CACHE_TTL'],
+    max_entries=app.config['PROBE_CACHE_SIZE']
+)
+
+# Fetched playlists, revalidated with ETag / Last-Modified on the next search
+playlist_cache = HTTPCache(
+    app.config['PLAYLIST_CACHE_DIR'],
+    max_bytes=app.config['PLAYLIST_CACHE_MAX_BYTES']
+)
 
 @app.route('/')
 def index():
@@ -35,10 +88,8 @@ def search():
         db.session.add(search_entry)
         db.session.commit()
         
-        # Start background processing
-        thread = threading.Thread(target=process_playlist, args=(search_entry.id, url))
-        thread.daemon = True
-        thread.start()
+        # Queue background processing
+        enqueue('process_playlist', search_history_id=search_entry.id, search_id=search_entry.id, url=url)
         
         return redirect(url_for('validate', search_id=search_entry.id))
     
@@ -47,14 +98,32 @@ def search():
 @app.route('/validate/<int:search_id>')
 def validate(search_id):
     search_entry = SearchHistory.query.get_or_404(search_id)
-    channels = Channel.query.filter_by(search_history_id=search_id).all()
+    # Channels themselves are fetched page by page from the listing API
+    categories = category_counts(search_id)
+    exports = PlaylistExport.query.filter_by(search_history_id=search_id).order_by(
+        PlaylistExport.export_date.desc()
+    ).limit(10).all()
     
-    return render_template('validate.html', search_entry=search_entry, channels=channels)
+    return render_template('validate.html', search_entry=search_entry, categories=categories,
+                           sorts=list(SORTS), exports=exports, uncategorized=UNCATEGORIZED)
 
 @app.route('/history')
 def history():
-    searches = SearchHistory.query.order_by(SearchHistory.search_date.desc()).all()
-    return render_template('history.html', searches=searches)
+    searches = db.paginate(
+        db.select(SearchHistory).order_by(SearchHistory.search_date.desc(), SearchHistory.id.desc()),
+        per_page=HISTORY_PAGE_SIZE,
+        max_per_page=100
+    )
+    # Totals over the whole history, computed by the database
+    total_searches, total_found, total_valid = db.session.execute(
+        select(
+            func.count(SearchHistory.id),
+            func.coalesce(func.sum(SearchHistory.channels_found), 0),
+            func.coalesce(func.sum(SearchHistory.valid_channels), 0)
+        )
+    ).one()
+    totals = {'searches': total_searches, 'channels_found': total_found, 'valid_channels': total_valid}
+    return render_template('history.html', searches=searches, totals=totals)
 
 @app.route('/api/search/<int:search_id>/status')
 def search_status(search_id):
@@ -63,70 +132,158 @@ def search_status(search_id):
         'status': search_entry.status,
         'title': search_entry.title,
         'channels_found': search_entry.channels_found,
-        'valid_channels': search_entry.valid_channels
+        'valid_channels': search_entry.valid_channels,
+        'tested_channels': search_entry.tested_channels,
+        'working_channels': search_entry.working_channels,
+        'failed_channels': search_entry.failed_channels,
+        'throughput': search_entry.probe_rate,
+        'eta_seconds': search_entry.probe_eta,
+        'probe_started_at': search_entry.probe_started_at.isoformat() if search_entry.probe_started_at else None,
+        'probe_updated_at': search_entry.probe_updated_at.isoformat() if search_entry.probe_updated_at else None
     })
 
+@app.route('/api/search/<int:search_id>/channels')
+def search_channels(search_id):
+    """One page of a search's channels, filtered and sorted on the server"""
+    SearchHistory.query.get_or_404(search_id)
+    try:
+        channels, next_cursor = list_channels(
+            search_id,
+            status=request.args.get('status') or None,
+            category=request.args.get('category') or None,
+            name_prefix=request.args.get('q') or None,
+            sort=request.args.get('sort') or DEFAULT_SORT,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', 100, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'channels': channels, 'next_cursor': next_cursor})
+
+@app.route('/api/channels/search')
+def channel_search():
+    """Full-text search over the channels of every stored search, best match first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    
+    results = search_channel_index(
+        query,
+        working_only=request.args.get('working') in ('1', 'true'),
+        limit=request.args.get('limit', 50, type=int)
+    )
+    return jsonify({'query': query, 'channels': results})
+
 @app.route('/api/channel/<int:channel_id>/test')
 def test_channel(channel_id):
-    thread = threading.Thread(target=test_channel_connectivity, args=(channel_id,))
-    thread.daemon = True
-    thread.start()
+    channel = Channel.query.get_or_404(channel_id)
+    # Its own lane: the test doesn't wait for a running search to finish
+    enqueue('test_channel', search_history_id=channel.search_history_id, lane=INTERACTIVE_LANE,
+            channel_id=channel_id)
     return jsonify({'status': 'testing'})
 
+@app.route('/api/http/stats')
+def http_stats():
+    """Connection pool and DNS cache usage of this process's HTTP client
+
+    A separate `python worker.py` process has its own client; these numbers
+    cover the requests made here (including the embedded worker, if enabled).
+    """
+    return jsonify(shared_client().stats())
+
 @app.route('/export/<int:search_id>')
 def export_playlist(search_id):
     search_entry = SearchHistory.query.get_or_404(search_id)
-    channels = Channel.query.filter_by(search_history_id=search_id, is_working=True).all()
+    channels_count = Channel.query.filter_by(search_history_id=search_id, is_working=True).count()
     
-    if not channels:
+    if not channels_count:
         flash('Nenhum canal válido encontrado para exportar', 'error')
         return redirect(url_for('validate', search_id=search_id))
     
-    # Generate M3U content
-    m3u_content = "#EXTM3U\n"
-    for channel in channels:
-        m3u_content += f'#EXTINF:-1 tvg-name="{channel.name}"'
-        if channel.logo:
-            m3u_content += f' tvg-logo="{channel.logo}"'
-        if channel.category:
-            m3u_content += f' group-title="{channel.category}"'
-        m3u_content += f',{channel.name}\n'
-        m3u_content += f'{channel.url}\n'
+    filename = f"{search_entry.title or 'playlist'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.m3u"
     
-    # Save export
-    export = PlaylistExport(
-        filename=f"{search_entry.title or 'playlist'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.m3u",
-        content=m3u_content,
-        channels_count=len(channels),
-        export_date=datetime.utcnow(),
-        export_type='m3u'
+    # Stream the playlist as it is read from the database
+    return Response(
+        stream_with_context(stream_export(search_id, filename, channels_count)),
+        mimetype='application/x-mpegurl',
+        headers={'Content-Disposition': attachment_header(filename)}
     )
-    db.session.add(export)
-    db.session.commit()
+
+@app.route('/exports/<int:export_id>/download')
+def download_export(export_id):
+    """Download a stored export, sending the compressed bytes when possible"""
+    export = PlaylistExport.query.get_or_404(export_id)
+    headers = {'Content-Disposition': attachment_header(export.filename), 'Vary': 'Accept-Encoding'}
     
-    # Send file
-    file_buffer = io.BytesIO()
-    file_buffer.write(m3u_content.encode('utf-8'))
-    file_buffer.seek(0)
+    if not export.content_hash:
+        # Legacy export that was never compacted
+        return Response(export.content, mimetype='application/x-mpegurl', headers=headers)
     
-    return send_file(
-        file_buffer,
-        mimetype='application/x-mpegurl',
-        as_attachment=True,
-        download_name=export.filename
-    )
+    blob = db.session.get(ExportBlob, export.content_hash)
+    if request.accept_encodings['gzip']:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(blob.data, mimetype='application/x-mpegurl', headers=headers)
+    
+    return Response(iter_gunzip(blob.data), mimetype='application/x-mpegurl', headers=headers)
+
+def attachment_header(filename):
+    """Content-Disposition value that survives non-ASCII playlist titles"""
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+@job_handler('process_playlist')
+def process_playlist_job(payload, job):
+    process_playlist(payload['search_id'], payload['url'], job=job)
+
+@job_handler('test_channel')
+def test_channel_job(payload, job):
+    test_channel_connectivity(payload['channel_id'])
+
+@job_handler('revalidate')
+def revalidate_job(payload, job):
+    revalidate_stale_channels()
 
-def process_playlist(search_id, url):
+if app.config['REVALIDATE_ENABLED']:
+    schedule_periodic('revalidate', app.config['REVALIDATE_INTERVAL'])
+
+@job_handler('viewer_cleanup')
+def viewer_cleanup_job(payload, job):
+    cutoff = datetime.utcnow() - timedelta(days=app.config['VIEWER_RETENTION_DAYS'])
+    deleted = delete_expired_playlists(cutoff)
+    if deleted:
+        app.logger.info(f"Deleted {deleted} expired viewer playlist(s)")
+
+if app.config['VIEWER_RETENTION_DAYS'] > 0:
+    schedule_periodic('viewer_cleanup', app.config['VIEWER_CLEANUP_INTERVAL'])
+
+def process_playlist(search_id, url, job=None):
     """Background task to process playlist"""
     with app.app_context():
         try:
             search_entry = SearchHistory.query.get(search_id)
-            validator = M3UValidator()
+            resume_phase = job.checkpoint.get('phase') if job and job.resume else None
+            if job and job.resume and search_entry.status == 'failed':
+                # A retry after an error; the failure was only provisional
+                search_entry.status = 'processing'
+                db.session.commit()
+            
+            if resume_phase == 'probe':
+                # Channels were already stored before the worker was lost
+                test_all_channels(search_id, job=job, resume=True)
+                return
+            
+            validator = make_playlist_validator()
             
-            # Try to fetch content
+            # Try to fetch content. Direct playlists are streamed line by line
+            # and parsed as they arrive instead of being loaded whole.
             content = None
             if url.endswith('.m3u') or url.endswith('.m3u8'):
-                content = validator.fetch_m3u_content(url)
+                content = validator.open_m3u_stream(url)
+            elif app.config['CRAWL_ENABLED'] and crawl_playlists(search_entry, url, job, resume_phase == 'ingest'):
+                # The playlists linked from the page are stored in this search
+                finish_ingest(search_entry, job)
+                return
             else:
                 # Try to scrape website for M3U content
                 try:
@@ -142,104 +299,315 @@ def process_playlist(search_id, url):
                 db.session.commit()
                 return
             
-            # Parse M3U content
-            channels_data = validator.parse_m3u_content(content)
+            # Parse M3U content; the title is read from the #EXTM3U header
+            # while the first channel is being parsed
+            playlist_info = {}
+            channels_data = validator.parse_m3u_content(content, playlist_info)
+            first_channel = next(channels_data, None)
+            if first_channel is not None:
+                channels_data = itertools.chain([first_channel], channels_data)
             
-            # Extract title from content
-            title_match = re.search(r'#EXTM3U.*?title="([^"]*)"', content, re.IGNORECASE)
-            if title_match:
-                search_entry.title = title_match.group(1)
+            if playlist_info.get('title'):
+                search_entry.title = playlist_info['title']
             else:
                 search_entry.title = f"Lista IPTV - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             
-            # Save channels
-            for channel_data in channels_data:
-                channel = Channel(
-                    name=channel_data['name'],
-                    url=channel_data['url'],
-                    category=channel_data.get('category'),
-                    logo=channel_data.get('logo'),
-                    group=channel_data.get('group'),
-                    search_history_id=search_id
-                )
-                db.session.add(channel)
-            
-            search_entry.channels_found = len(channels_data)
-            search_entry.status = 'completed'
             db.session.commit()
             
-            # Start testing channels
-            test_all_channels(search_id)
+            # Save channels. channels_found is committed with every chunk, so
+            # a resumed ingest skips the entries that are already stored.
+            if job:
+                job.save(phase='ingest')
+            skip = search_entry.channels_found if resume_phase == 'ingest' else 0
+            save_channels(search_entry, itertools.islice(channels_data, skip, None))
+            finish_ingest(search_entry, job)
             
         except Exception as e:
             app.logger.error(f"Error processing playlist: {e}")
+            db.session.rollback()
             search_entry = SearchHistory.query.get(search_id)
+            # Once the probe phase starts the channels are all stored and
+            # only probing failed
+            if job:
+                ingested = job.checkpoint.get('phase') == 'probe'
+            else:
+                ingested = search_entry.status == 'completed'
             search_entry.status = 'failed'
             search_entry.title = f'Erro: {str(e)}'
+            if isinstance(e, TRANSIENT_ERRORS):
+                db.session.commit()
+                # The job is marked failed too, and retried while it has attempts left
+                raise
+            # Anything else (an oversized or malformed playlist) fails the
+            # same way every time: drop the partial channels and give up
+            if not ingested:
+                db.session.execute(delete(Channel).where(Channel.search_history_id == search_id))
+                search_entry.channels_found = 0
             db.session.commit()
 
-def test_all_channels(search_id):
+def make_playlist_validator():
+    return M3UValidator(
+        http_cache=playlist_cache,
+        max_playlist_bytes=app.config['PLAYLIST_MAX_BYTES']
+    )
+
+def finish_ingest(search_entry, job=None):
+    """Mark a search's channels as stored and start testing them"""
+    search_entry.status = 'completed'
+    db.session.commit()
+    
+    if job:
+        job.save(phase='probe')
+    test_all_channels(search_entry.id, job=job)
+
+def crawl_playlists(search_entry, url, job=None, resume=False):
+    """Ingest the playlist at `url`, or every playlist linked from the page there
+    
+    Playlists are downloaded in parallel by a PlaylistCrawler and stored one
+    at a time as they complete. The checkpoint records the playlists already
+    stored, so a resumed job drops the partially stored one and skips the
+    rest. Returns False if the page links to no playlist.
+    """
+    crawled = []
+    if resume and job and 'crawled' in job.checkpoint:
+        crawled = job.checkpoint['crawled']
+        # Channels stored after the last completed playlist are re-ingested
+        db.session.execute(delete(Channel).where(
+            Channel.search_history_id == search_entry.id,
+            Channel.id > job.checkpoint['crawl_last_id']
+        ))
+        search_entry.channels_found = job.checkpoint['crawl_channels']
+        db.session.commit()
+    elif job:
+        # Checkpoint before anything is stored, so a job lost during the
+        # first playlist also drops its partial channels when resumed
+        job.save(phase='ingest', crawled=[], crawl_last_id=_last_channel_id(search_entry),
+                 crawl_channels=search_entry.channels_found or 0)
+    
+    crawler = PlaylistCrawler(
+        make_playlist_validator,
+        max_depth=app.config['CRAWL_MAX_DEPTH'],
+        max_workers=app.config['CRAWL_MAX_WORKERS'],
+        max_links=app.config['CRAWL_MAX_LINKS'],
+        per_host_concurrency=app.config['CRAWL_PER_HOST_CONCURRENCY'],
+        per_host_interval=app.config['CRAWL_PER_HOST_INTERVAL']
+    )
+    validator = make_playlist_validator()
+    title = None
+    for playlist_url, body in crawler.crawl(url, skip=crawled):
+        with body:
+            playlist_info = {}
+            channels_data = validator.parse_m3u_content(body, playlist_info)
+            first_channel = next(channels_data, None)
+            if first_channel is None:
+                continue
+            title = title or playlist_info.get('title')
+            app.logger.info(f"Ingesting playlist {playlist_url} found on {url}")
+            save_channels(search_entry, itertools.chain([first_channel], channels_data))
+        
+        crawled.append(playlist_url)
+        if job:
+            job.save(phase='ingest', crawled=crawled, crawl_last_id=_last_channel_id(search_entry),
+                     crawl_channels=search_entry.channels_found)
+    
+    if not crawled:
+        return False
+    search_entry.title = title or f"Lista IPTV - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    db.session.commit()
+    return True
+
+def _last_channel_id(search_entry):
+    return db.session.execute(
+        select(func.max(Channel.id)).where(Channel.search_history_id == search_entry.id)
+    ).scalar() or 0
+
+def save_channels(search_entry, channels_data):
+    """Bulk insert parsed channels in chunks, committing after each one"""
+    chunk_size = app.config['CHANNEL_INSERT_CHUNK_SIZE']
+    chunk = []
+    
+    for channel_data in channels_data:
+        chunk.append({
+            'name': channel_data['name'],
+            'url': channel_data['url'],
+            'url_hash': url_hash(channel_data['url']),
+            'category': channel_data.get('category'),
+            'logo': channel_data.get('logo'),
+            'group': channel_data.get('group'),
+            'is_working': None,
+            'search_history_id': search_entry.id
+        })
+        if len(chunk) >= chunk_size:
+            _insert_channel_chunk(search_entry, chunk)
+            chunk = []
+    
+    if chunk:
+        _insert_channel_chunk(search_entry, chunk)
+
+def _insert_channel_chunk(search_entry, chunk):
+    channel_categorizer.categorize_many(chunk)
+    last_id = db.session.execute(select(func.max(Channel.id))).scalar() or 0
+    # Core executemany INSERT: no ORM identity tracking per channel
+    db.session.execute(insert(Channel), chunk)
+    index_channels(search_entry.id, after_id=last_id)
+    search_entry.channels_found = (search_entry.channels_found or 0) + len(chunk)
+    db.session.commit()
+
+def test_all_channels(search_id, job=None, resume=False):
     """Test all channels for a search"""
     with app.app_context():
-        channels = Channel.query.filter_by(search_history_id=search_id).all()
-        validator = M3UValidator()
-        
-        for channel in channels:
-            try:
-                is_working = validator.test_stream_connectivity(channel.url)
-                channel.is_working = is_working
-                channel.last_checked = datetime.utcnow()
-                time.sleep(0.1)  # Small delay to avoid overwhelming servers
-            except Exception as e:
-                app.logger.error(f"Error testing channel {channel.name}: {e}")
-                channel.is_working = False
-                channel.last_checked = datetime.utcnow()
+        search_entry = SearchHistory.query.get(search_id)
+        query = select(Channel.id, Channel.url).where(Channel.search_history_id == search_id)
+        resume = resume and search_entry.probe_started_at is not None
+        if resume:
+            # Only channels not yet written back by the interrupted run
+            query = query.where(or_(
+                Channel.last_checked.is_(None),
+                Channel.last_checked < search_entry.probe_started_at
+            ))
+        channels = db.session.execute(query).all()
+        prober = make_prober()
         
+        total = search_entry.channels_found
+        if resume:
+            search_entry.tested_channels = total - len(channels)
+            search_entry.working_channels = Channel.query.filter(
+                Channel.search_history_id == search_id,
+                Channel.is_working.is_(True),
+                Channel.last_checked >= search_entry.probe_started_at
+            ).count()
+            search_entry.failed_channels = search_entry.tested_channels - search_entry.working_channels
+        else:
+            search_entry.tested_channels = 0
+            search_entry.working_channels = 0
+            search_entry.failed_channels = 0
+            search_entry.probe_rate = None
+            search_entry.probe_eta = None
+            search_entry.probe_started_at = datetime.utcnow()
+            search_entry.probe_updated_at = search_entry.probe_started_at
         db.session.commit()
         
+        for results in prober.probe(channels):
+            save_probe_results(results)
+            _record_probe_progress(search_entry, results, total)
+            db.session.commit()
+            if job:
+                job.save(phase='probe', tested=search_entry.tested_channels)
+        
         # Update search entry
-        search_entry = SearchHistory.query.get(search_id)
-        search_entry.valid_channels = len([c for c in channels if c.is_working == True])
+        search_entry.valid_channels = Channel.query.filter_by(
+            search_history_id=search_id, is_working=True
+        ).count()
+        search_entry.probe_eta = 0
         db.session.commit()
 
+def save_probe_results(results):
+    """Write a batch of probe results with one executemany UPDATE (not committed)"""
+    if not results:
+        return
+    
+    table = Channel.__table__
+    fields = [key for key in results[0] if key != 'id']
+    values = {field: bindparam(f'b_{field}') for field in fields}
+    # SET expressions read the old row, so a status change counts as a flip
+    values['check_count'] = func.coalesce(table.c.check_count, 0) + 1
+    values['flip_count'] = func.coalesce(table.c.flip_count, 0) + case(
+        (and_(table.c.is_working.isnot(None), table.c.is_working != bindparam('b_is_working')), 1),
+        else_=0
+    )
+    
+    stmt = update(table).where(table.c.id == bindparam('b_id')).values(values)
+    db.session.execute(stmt, [{f'b_{key}': value for key, value in result.items()} for result in results])
+
+def _record_probe_progress(search_entry, results, total):
+    working = sum(1 for result in results if result['is_working'])
+    now = datetime.utcnow()
+    
+    search_entry.tested_channels += len(results)
+    search_entry.working_channels += working
+    search_entry.failed_channels += len(results) - working
+    search_entry.probe_updated_at = now
+    
+    elapsed = (now - search_entry.probe_started_at).total_seconds()
+    if elapsed > 0:
+        search_entry.probe_rate = round(search_entry.tested_channels / elapsed, 2)
+        remaining = max(total - search_entry.tested_channels, 0)
+        search_entry.probe_eta = int(remaining / search_entry.probe_rate) if search_entry.probe_rate else None
+
 def test_channel_connectivity(channel_id):
     """Test single channel connectivity"""
     with app.app_context():
         channel = Channel.query.get(channel_id)
         if channel:
-            validator = M3UValidator()
-            try:
-                is_working = validator.test_stream_connectivity(channel.url)
-                channel.is_working = is_working
-                channel.last_checked = datetime.utcnow()
-                db.session.commit()
-            except Exception as e:
-                app.logger.error(f"Error testing channel {channel.name}: {e}")
-                channel.is_working = False
-                channel.last_checked = datetime.utcnow()
-                db.session.commit()
+            # Same probe mode and cache as a full run, for a single channel
+            for results in make_prober().probe([(channel.id, channel.url)]):
+                save_probe_results(results)
+            db.session.commit()
+
+def revalidate_stale_channels():
+    """Re-test the most important stale channels within one cycle's time budget"""
+    with app.app_context():
+        deadline = time.monotonic() + app.config['REVALIDATE_CYCLE_BUDGET']
+        channels = select_stale_channels(
+            older_than=timedelta(hours=app.config['REVALIDATE_AFTER_HOURS']),
+            limit=app.config['REVALIDATE_BATCH_SIZE'],
+            flakiness_weight=app.config['REVALIDATE_FLAKINESS_WEIGHT'],
+            export_weight=app.config['REVALIDATE_EXPORT_WEIGHT']
+        )
+        if not channels:
+            return
+        
+        search_ids = {channel.search_history_id for channel in channels}
+        tested = 0
+        for results in make_prober().probe([(c.id, c.url) for c in channels], deadline=deadline):
+            save_probe_results(results)
+            db.session.commit()
+            tested += len(results)
+        
+        # Keep the per-search totals in line with the refreshed statuses
+        counts = dict(db.session.execute(
+            select(Channel.search_history_id, func.count())
+            .where(Channel.search_history_id.in_(search_ids), Channel.is_working.is_(True))
+            .group_by(Channel.search_history_id)
+        ).all())
+        for search_entry in SearchHistory.query.filter(SearchHistory.id.in_(search_ids)):
+            search_entry.valid_channels = counts.get(search_entry.id, 0)
+        db.session.commit()
+        app.logger.info(f"Re-validated {tested} of {len(channels)} stale channels")
+
+def make_prober():
+    """ChannelProber configured from the app settings"""
+    return ChannelProber(
+        concurrency=app.config['PROBE_CONCURRENCY'],
+        batch_size=app.config['PROBE_BATCH_SIZE'],
+        per_host_concurrency=app.config['PROBE_PER_HOST_CONCURRENCY'],
+        per_host_interval=app.config['PROBE_PER_HOST_INTERVAL'],
+        cache=probe_cache,
+        mode=app.config['PROBE_MODE']
+    )
 
 @app.route('/m3u_viewer')
 def m3u_viewer():
     """Render M3U viewer page"""
-    return render_template('m3u_viewer.html', m3u_content='')
+    return render_template('m3u_viewer.html', playlist=None, categories=[], uncategorized=UNCATEGORIZED)
 
 @app.route('/m3u_viewer/<path:filename>')
 def m3u_viewer_file(filename):
     """Render M3U viewer page with file content"""
     try:
-        # Read the M3U file content
+        # Parse the M3U file once; identical files reuse the stored entries
         file_path = os.path.join('attached_assets', filename)
         if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                m3u_content = f.read()
-        else:
-            m3u_content = ''
+            with open(file_path, 'rb') as f:
+                playlist = import_playlist(os.path.basename(filename), f, make_viewer_validator(),
+                                           app.config['CHANNEL_INSERT_CHUNK_SIZE'])
+            if playlist:
+                return redirect(url_for('viewer_playlist', playlist_id=playlist.id))
         
-        return render_template('m3u_viewer.html', m3u_content=m3u_content)
+        return render_template('m3u_viewer.html', playlist=None, categories=[], uncategorized=UNCATEGORIZED)
     except Exception as e:
         app.logger.error(f"Error loading M3U file: {e}")
-        return render_template('m3u_viewer.html', m3u_content='')
+        return render_template('m3u_viewer.html', playlist=None, categories=[], uncategorized=UNCATEGORIZED)
 
 @app.route('/m3u_viewer_upload', methods=['GET', 'POST'])
 def m3u_viewer_upload():
@@ -256,21 +624,68 @@ def m3u_viewer_upload():
         
         if file and file.filename.lower().endswith(('.m3u', '.m3u8', '.txt')):
             try:
-                m3u_content = file.read().decode('utf-8')
-                return render_template('m3u_viewer.html', m3u_content=m3u_content)
+                # Parsed on the server; the page then loads the entries in pages
+                playlist = import_playlist(file.filename, file.stream, make_viewer_validator(),
+                                           app.config['CHANNEL_INSERT_CHUNK_SIZE'])
             except Exception as e:
                 flash(f'Erro ao processar arquivo: {e}', 'error')
                 return redirect(request.url)
+            if playlist is None:
+                flash('Nenhuma entrada encontrada no arquivo. Verifique se é uma lista M3U válida.', 'error')
+                return redirect(request.url)
+            return redirect(url_for('viewer_playlist', playlist_id=playlist.id))
         else:
             flash('Formato de arquivo não suportado. Use .m3u, .m3u8 ou .txt', 'error')
             return redirect(request.url)
     
     return render_template('m3u_upload.html')
 
-@app.route('/demo_m3u')
-def demo_m3u():
-    """Demo page with the provided M3U content"""
-    demo_content = """#EXTM3U
+@app.route('/viewer/<int:playlist_id>')
+def viewer_playlist(playlist_id):
+    """M3U viewer for a playlist parsed on the server"""
+    playlist = ViewerPlaylist.query.get_or_404(playlist_id)
+    return render_template('m3u_viewer.html', playlist=playlist, categories=entry_categories(playlist_id),
+                           uncategorized=UNCATEGORIZED)
+
+@app.route('/api/viewer/<int:playlist_id>/entries')
+def viewer_entries(playlist_id):
+    """One page of a viewer playlist's entries, optionally filtered by name and category"""
+    ViewerPlaylist.query.get_or_404(playlist_id)
+    search = request.args.get('q', '').strip() or None
+    category = request.args.get('category') or None
+    cursor = request.args.get('cursor', type=int)
+    
+    entries, next_cursor = list_entries(
+        playlist_id, search=search, category=category, after_id=cursor,
+        limit=request.args.get('limit', 100, type=int)
+    )
+    response = {'entries': entries, 'next_cursor': next_cursor}
+    if cursor is None:
+        # The matching total is only needed (and only counted) for the first page
+        response['total'] = count_entries(playlist_id, search=search, category=category)
+    return jsonify(response)
+
+@app.route('/viewer/<int:playlist_id>/export.m3u')
+def viewer_export(playlist_id):
+    """Stream the (filtered) entries of a viewer playlist as an M3U file"""
+    playlist = ViewerPlaylist.query.get_or_404(playlist_id)
+    chunks = iter_viewer_m3u(
+        playlist_id,
+        search=request.args.get('q', '').strip() or None,
+        category=request.args.get('category') or None
+    )
+    filename = f"filmes_{datetime.now().strftime('%Y-%m-%d')}.m3u"
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/x-mpegurl',
+        headers={'Content-Disposition': attachment_header(filename)}
+    )
+
+def make_viewer_validator():
+    return M3UValidator(max_playlist_bytes=app.config['PLAYLIST_MAX_BYTES'])
+
+# Playlist behind /demo_m3u, stored once at startup by import_demo_playlist
+DEMO_M3U = """#EXTM3U
 #EXTINF:-1 tvg-id="" tvg-name="Kill O Massacre no Trem" tvg-logo="https://image.tmdb.org/t/p/w400/mxgrtJvngNhppjCwu2AvdCtvSXa.jpg" group-title="(VOD BR) Filmes",Kill O Massacre no Trem
 https://apiceplay.nexus/movie/20613489/69683690/1511266.mp4
 #EXTINF:-1 tvg-id="" tvg-name="Martha" tvg-logo="https://image.tmdb.org/t/p/w400/4WN19oCTXlK8jXC0QZgNkBpcJcw.jpg" group-title="(VOD BR) Filmes",Martha
@@ -313,27 +728,64 @@ https://apiceplay.nexus/movie/20613489/69683690/1511262.mp4
 https://apiceplay.nexus/movie/20613489/69683690/1511263.mp4
 #EXTINF:-1 tvg-id="" tvg-name="Fique Acordado" tvg-logo="https://image.tmdb.org/t/p/w400/izPVZlS3FcfVjiQ4kjQKppIwja0.jpg" group-title="(VOD BR) Filmes",Fique Acordado
 https://apiceplay.nexus/movie/20613489/69683690/1135312.mp4"""
-    
-    return render_template('m3u_viewer.html', m3u_content=demo_content)
+DEMO_M3U_HASH = hashlib.sha256(DEMO_M3U.encode('utf-8')).hexdigest()
+
+def import_demo_playlist():
+    """Store the demo playlist (pinned, so retention keeps it) unless it already exists"""
+    with app.app_context():
+        playlist = import_playlist('demo.m3u', io.BytesIO(DEMO_M3U.encode('utf-8')), make_viewer_validator())
+        if not playlist.pinned:
+            playlist.pinned = True
+            db.session.commit()
 
-@app.route('/download_html')
+@app.route('/demo_m3u')
+def demo_m3u():
+    """Demo page with the provided M3U content"""
+    playlist = ViewerPlaylist.query.filter_by(content_hash=DEMO_M3U_HASH).first_or_404()
+    return redirect(url_for('viewer_playlist', playlist_id=playlist.id))
+
+@app.route('/download_html', methods=['GET', 'POST'])
 def download_html():
-    """Download HTML file with M3U content"""
-    m3u_content = request.args.get('content', '')
+    """Download the offline HTML viewer for a playlist
     
-    # Generate complete HTML file
-    html_content = generate_offline_html(m3u_content)
-    
-    # Create file in memory
-    file_buffer = io.BytesIO()
-    file_buffer.write(html_content.encode('utf-8'))
-    file_buffer.seek(0)
+    The playlist is referenced by `playlist_id`, or sent in a POST as an
+    uploaded `file`, a `content` form field or the raw request body. Sent
+    playlists are imported like viewer uploads, so identical content maps to
+    one stored playlist and one cached page.
+    """
+    playlist_id = request.values.get('playlist_id', type=int)
+    if playlist_id:
+        playlist = ViewerPlaylist.query.get_or_404(playlist_id)
+    else:
+        playlist = import_playlist('offline.m3u', _playlist_upload(), make_viewer_validator(),
+                                   app.config['CHANNEL_INSERT_CHUNK_SIZE'])
+        if playlist is None:
+            flash('Nenhum canal encontrado no arquivo M3U', 'error')
+            return redirect(url_for('m3u_viewer'))
     
+    compress = app.config['OFFLINE_HTML_COMPRESS']
     filename = f"visualizador_m3u_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+    headers = {'Content-Disposition': attachment_header(filename), 'Vary': 'Accept-Encoding'}
+    blob = cached_offline_html(playlist, compress)
+    if blob is None:
+        # First download: generate while sending, and keep a copy for next time
+        return Response(stream_with_context(stream_offline_html(playlist, compress)),
+                        mimetype='text/html', headers=headers)
+    
+    if request.accept_encodings['gzip']:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(blob.data, mimetype='text/html', headers=headers)
     
-    return send_file(
-        file_buffer,
-        mimetype='text/html',
-        as_attachment=True,
-        download_name=filename
-    )
\ No newline at end of file
+    return Response(iter_gunzip(blob.data), mimetype='text/html', headers=headers)
+
+def _playlist_upload():
+    """Seekable file holding the playlist sent to /download_html"""
+    if 'file' in request.files:
+        return request.files['file'].stream
+    if 'content' in request.values:
+        # Legacy clients that send the playlist text itself
+        return io.BytesIO(request.values['content'].encode('utf-8'))
+    body = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    shutil.copyfileobj(request.stream, body)
+    body.seek(0)
+    return body
\ No newline at end of file
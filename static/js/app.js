@@ -69,12 +69,12 @@ function stopAutoRefresh() {
 function refreshSearchStatus() {
     if (!searchId) return;
     
-    fetch(`/api/search_status/${searchId}`)
+    fetch(`/api/search/${searchId}/status`)
         .then(response => response.json())
         .then(data => {
             updateStatusDisplay(data);
             
-            if (data.status === 'completed') {
+            if (data.status === 'completed' && data.tested_channels >= data.channels_found) {
                 stopAutoRefresh();
                 // Reload page to show channels
                 setTimeout(() => {
@@ -154,7 +154,7 @@ function testChannel(channelId) {
     button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Testando...';
     button.disabled = true;
     
-    fetch(`/api/test_channel/${channelId}`)
+    fetch(`/api/channel/${channelId}/test`)
         .then(response => response.json())
         .then(data => {
             if (data.status === 'testing') {
@@ -0,0 +1,89 @@
+/*
+ * Payload decoding and filtering for the offline viewer.
+ *
+ * The playlist is parsed on the server and embedded as columnar JSON
+ * (see offline_html_generator.build_payload), optionally gzip+base64
+ * compressed. This runs as a Web Worker so that decoding and filtering
+ * large playlists never block the page. If workers are unavailable, the
+ * page evaluates this file itself and calls handleMessage directly.
+ *
+ * Messages in:  {type: 'load', payloadType, text}
+ *               {type: 'filter', id, term, category}
+ * Messages out: {type: 'loaded', names, logos, categories, urls, categoryList}
+ *               {type: 'failed', message}
+ *               {type: 'filtered', id, indices}   (Int32Array of entry indices)
+ */
+var entryCategories = [];
+// Lowercase names, built once so filtering does no per-keystroke allocation
+var searchIndex = [];
+
+function readPayload(payloadType, text) {
+    if (payloadType !== 'application/gzip+base64') {
+        return Promise.resolve(JSON.parse(text));
+    }
+    if (typeof DecompressionStream === 'undefined') {
+        return Promise.reject(new Error('Este navegador não suporta arquivos compactados'));
+    }
+    var binary = atob(text.trim());
+    var bytes = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+    var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    return new Response(stream).json();
+}
+
+function expandPayload(payload) {
+    // Resolve the interned columns back into one value per entry
+    var count = payload.names.length;
+    var categories = new Array(count);
+    var logos = new Array(count);
+    for (var i = 0; i < count; i++) {
+        categories[i] = payload.categories[payload.category[i]];
+        logos[i] = payload.logo[i] ? payload.logoPrefixes[payload.logoPrefix[i]] + payload.logo[i] : '';
+    }
+    var categoryList = Array.from(new Set(payload.categories.map(function(category) {
+        return category || 'Sem Categoria';
+    }))).sort();
+
+    return {
+        names: payload.names,
+        logos: logos,
+        categories: categories,
+        urls: payload.urls,
+        categoryList: categoryList
+    };
+}
+
+function filterEntries(term, category) {
+    var matches = [];
+    for (var i = 0; i < searchIndex.length; i++) {
+        if (category && (entryCategories[i] || 'Sem Categoria') !== category) continue;
+        if (term && searchIndex[i].indexOf(term) === -1) continue;
+        matches.push(i);
+    }
+    return Int32Array.from(matches);
+}
+
+function handleMessage(data, reply) {
+    if (data.type === 'load') {
+        readPayload(data.payloadType, data.text).then(function(payload) {
+            var result = expandPayload(payload);
+            entryCategories = result.categories;
+            searchIndex = result.names.map(function(name) { return name.toLowerCase(); });
+            result.type = 'loaded';
+            reply(result);
+        }).catch(function(error) {
+            reply({ type: 'failed', message: String(error && error.message || error) });
+        });
+    } else if (data.type === 'filter') {
+        var indices = filterEntries(data.term, data.category);
+        reply({ type: 'filtered', id: data.id, indices: indices }, [indices.buffer]);
+    }
+}
+
+if (typeof WorkerGlobalScope !== 'undefined' && self instanceof WorkerGlobalScope) {
+    self.onmessage = function(e) {
+        handleMessage(e.data, function(message, transfer) {
+            self.postMessage(message, transfer || []);
+        });
+    };
+}
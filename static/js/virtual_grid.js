@@ -0,0 +1,83 @@
+/*
+ * Virtualized card grid used by the M3U viewer and the offline HTML page.
+ *
+ * Only the rows inside (or near) the viewport are in the DOM; top and bottom
+ * padding stand in for the rows above and below, so the scrollbar still
+ * reflects the whole list. Cards must have a fixed height.
+ */
+function VirtualGrid(element, options) {
+    this.element = element;
+    this.rowHeight = options.rowHeight;
+    this.minColumnWidth = options.minColumnWidth;
+    this.overscan = options.overscan || 2;
+    this.renderItem = options.renderItem;
+    // Called when the last rows are rendered, e.g. to fetch another page
+    this.onNearEnd = options.onNearEnd || null;
+    this.count = 0;
+    this.rangeKey = null;
+    this.frameRequested = false;
+
+    const schedule = () => this.schedule();
+    window.addEventListener('scroll', schedule, { passive: true });
+    window.addEventListener('resize', () => this.refresh());
+}
+
+VirtualGrid.prototype.setCount = function(count) {
+    this.count = count;
+    this.refresh();
+};
+
+VirtualGrid.prototype.setMinColumnWidth = function(width) {
+    this.minColumnWidth = width;
+    this.element.style.gridTemplateColumns = `repeat(auto-fill, minmax(${width}px, 1fr))`;
+    this.refresh();
+};
+
+VirtualGrid.prototype.refresh = function() {
+    this.rangeKey = null;
+    this.schedule();
+};
+
+VirtualGrid.prototype.schedule = function() {
+    // Renders at most once per frame, however many scroll events arrive
+    if (this.frameRequested) return;
+    this.frameRequested = true;
+    requestAnimationFrame(() => {
+        this.frameRequested = false;
+        this.render();
+    });
+};
+
+VirtualGrid.prototype.render = function() {
+    const style = getComputedStyle(this.element);
+    const gap = parseFloat(style.rowGap) || 0;
+    // Same column count as grid-template-columns: repeat(auto-fill, minmax(w, 1fr))
+    const columns = Math.max(1, Math.floor((this.element.clientWidth + gap) / (this.minColumnWidth + gap)));
+    const rowStride = this.rowHeight + gap;
+    const totalRows = Math.ceil(this.count / columns);
+
+    const top = this.element.getBoundingClientRect().top + window.scrollY;
+    // Clamped so a list that shrank below the scroll position still shows its last rows
+    const visibleRows = Math.ceil(window.innerHeight / rowStride);
+    const firstRow = Math.min(Math.max(0, totalRows - visibleRows - this.overscan),
+        Math.max(0, Math.floor((window.scrollY - top) / rowStride) - this.overscan));
+    const lastRow = Math.min(totalRows,
+        Math.max(firstRow, Math.ceil((window.scrollY + window.innerHeight - top) / rowStride) + this.overscan));
+
+    const key = `${columns}:${firstRow}:${lastRow}:${this.count}`;
+    if (key !== this.rangeKey) {
+        this.rangeKey = key;
+        const html = [];
+        const end = Math.min(this.count, lastRow * columns);
+        for (let i = firstRow * columns; i < end; i++) {
+            html.push(this.renderItem(i));
+        }
+        this.element.style.paddingTop = (firstRow * rowStride) + 'px';
+        this.element.style.paddingBottom = ((totalRows - lastRow) * rowStride) + 'px';
+        this.element.innerHTML = html.join('');
+    }
+
+    if (this.onNearEnd && lastRow >= totalRows) {
+        this.onNearEnd();
+    }
+};
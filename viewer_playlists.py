@@ -0,0 +1,235 @@
+import hashlib
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select
+
+from app import db
+from channel_listing import UNCATEGORIZED
+from m3u_validator import M3UValidator
+from models import ExportBlob, ViewerEntry, ViewerPlaylist
+from offline_html_generator import PAGE_VERSION, iter_offline_html
+from playlist_export import ExportCompressor, store_blob
+
+READ_CHUNK_BYTES = 64 * 1024
+MAX_PAGE_SIZE = 500
+# Entries removed per statement when an expired playlist is deleted
+DELETE_BATCH_SIZE = 5000
+
+
+def _iter_file(fileobj: BinaryIO) -> Iterator[bytes]:
+    return iter(lambda: fileobj.read(READ_CHUNK_BYTES), b'')
+
+
+def _file_hash(fileobj: BinaryIO) -> str:
+    """SHA-256 of a seekable file, leaving it rewound"""
+    digest = hashlib.sha256()
+    for chunk in _iter_file(fileobj):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def import_playlist(filename: str, fileobj: BinaryIO, validator: M3UValidator,
+                    chunk_size: int = 2000) -> Optional[ViewerPlaylist]:
+    """Parse a playlist file into stored viewer entries and return its record
+
+    The file is read in chunks and the entries are inserted in batches, so
+    the playlist is never held in memory as a whole. Identical files reuse
+    the playlist parsed the first time (and keep it from expiring). Returns
+    None when the file has no entries.
+    """
+    content_hash = _file_hash(fileobj)
+    existing = ViewerPlaylist.query.filter_by(content_hash=content_hash).first()
+    if existing is not None:
+        existing.last_used_at = datetime.utcnow()
+        db.session.commit()
+        return existing
+
+    now = datetime.utcnow()
+    playlist = ViewerPlaylist(
+        filename=filename[:200],
+        content_hash=content_hash,
+        entries_count=0,
+        created_at=now,
+        last_used_at=now
+    )
+    db.session.add(playlist)
+    db.session.flush()
+
+    info = {}
+    entries = validator.parse_m3u_content(validator.iter_m3u_lines(_iter_file(fileobj)), info)
+    batch = []
+    try:
+        for entry in entries:
+            batch.append({
+                'playlist_id': playlist.id,
+                'name': entry['name'],
+                'url': entry['url'],
+                'logo': entry.get('logo'),
+                'category': (entry.get('category') or '')[:200] or None,
+            })
+            if len(batch) >= chunk_size:
+                db.session.execute(insert(ViewerEntry), batch)
+                playlist.entries_count += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(ViewerEntry), batch)
+            playlist.entries_count += len(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if not playlist.entries_count:
+        db.session.rollback()
+        return None
+
+    playlist.title = (info.get('title') or '')[:200] or None
+    db.session.commit()
+    return playlist
+
+
+def delete_expired_playlists(unused_since: datetime) -> int:
+    """Delete unpinned playlists last imported before `unused_since`, with their entries and pages
+
+    Entries are deleted in batches so a huge playlist never needs one long
+    write transaction. Returns the number of playlists deleted.
+    """
+    expired = db.session.execute(
+        select(ViewerPlaylist).where(
+            or_(ViewerPlaylist.pinned.is_(None), ViewerPlaylist.pinned.is_(False)),
+            func.coalesce(ViewerPlaylist.last_used_at, ViewerPlaylist.created_at) < unused_since
+        )
+    ).scalars().all()
+
+    for playlist in expired:
+        while True:
+            batch = select(ViewerEntry.id).where(
+                ViewerEntry.playlist_id == playlist.id
+            ).limit(DELETE_BATCH_SIZE).scalar_subquery()
+            result = db.session.execute(delete(ViewerEntry).where(ViewerEntry.id.in_(batch)))
+            db.session.commit()
+            if result.rowcount < DELETE_BATCH_SIZE:
+                break
+        keys = [offline_html_key(playlist, compress) for compress in (False, True)]
+        db.session.execute(delete(ExportBlob).where(ExportBlob.content_hash.in_(keys)))
+        db.session.delete(playlist)
+        db.session.commit()
+    return len(expired)
+
+
+def _filtered(query, playlist_id: int, search: Optional[str], category: Optional[str]):
+    query = query.where(ViewerEntry.playlist_id == playlist_id)
+    if search:
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.where(ViewerEntry.name.ilike(f'%{escaped}%', escape='\\'))
+    if category == UNCATEGORIZED:
+        query = query.where(or_(ViewerEntry.category.is_(None), ViewerEntry.category == ''))
+    elif category:
+        query = query.where(ViewerEntry.category == category)
+    return query
+
+
+def list_entries(playlist_id: int, search: Optional[str] = None, category: Optional[str] = None,
+                 after_id: Optional[int] = None, limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+    """One page of entries in playlist order, and the cursor (last id) for the next page"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = _filtered(
+        select(ViewerEntry.id, ViewerEntry.name, ViewerEntry.url, ViewerEntry.logo, ViewerEntry.category),
+        playlist_id, search, category
+    )
+    if after_id:
+        query = query.where(ViewerEntry.id > after_id)
+    rows = db.session.execute(query.order_by(ViewerEntry.id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    entries = [{
+        'id': row.id,
+        'name': row.name,
+        'url': row.url,
+        'logo': row.logo or '',
+        'category': row.category or '',
+    } for row in rows]
+    return entries, next_cursor
+
+
+def count_entries(playlist_id: int, search: Optional[str] = None, category: Optional[str] = None) -> int:
+    return db.session.execute(
+        _filtered(select(func.count(ViewerEntry.id)), playlist_id, search, category)
+    ).scalar()
+
+
+def iter_entries(playlist_id: int, search: Optional[str] = None, category: Optional[str] = None,
+                 batch_size: int = 1000) -> Iterator[Tuple]:
+    """Every (name, url, logo, category) of a playlist, in order, fetched in batches"""
+    rows = db.session.execute(
+        _filtered(
+            select(ViewerEntry.name, ViewerEntry.url, ViewerEntry.logo, ViewerEntry.category),
+            playlist_id, search, category
+        ).order_by(ViewerEntry.id).execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        yield tuple(row)
+
+
+def entry_categories(playlist_id: int) -> List[Tuple[str, int]]:
+    """(category, entry count) pairs, sorted by category name
+
+    Empty and missing categories are counted together under None, last,
+    matching the UNCATEGORIZED filter.
+    """
+    counts = {}
+    for category, count in db.session.execute(
+        select(ViewerEntry.category, func.count())
+        .where(ViewerEntry.playlist_id == playlist_id)
+        .group_by(ViewerEntry.category)
+    ).all():
+        counts[category or None] = counts.get(category or None, 0) + count
+    return sorted(counts.items(), key=lambda item: (item[0] is None, item[0] or ''))
+
+
+def iter_m3u(playlist_id: int, search: Optional[str] = None, category: Optional[str] = None,
+             batch_size: int = 1000) -> Iterator[bytes]:
+    """Yield the (filtered) entries of a playlist as encoded M3U"""
+    yield b'#EXTM3U\n'
+    lines = []
+    for name, url, logo, entry_category in iter_entries(playlist_id, search, category, batch_size):
+        entry = f'#EXTINF:-1 tvg-name="{name}"'
+        if logo:
+            entry += f' tvg-logo="{logo}"'
+        if entry_category:
+            entry += f' group-title="{entry_category}"'
+        lines.append(f'{entry},{name}\n{url}\n')
+        if len(lines) >= batch_size:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+def offline_html_key(playlist: ViewerPlaylist, compress: bool) -> str:
+    """Cache key of a playlist's offline page: its content, the page version and encoding"""
+    raw = f'offline-html:{PAGE_VERSION}:{int(compress)}:{playlist.content_hash or playlist.id}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cached_offline_html(playlist: ViewerPlaylist, compress: bool = False) -> Optional[ExportBlob]:
+    """The playlist's stored offline page (gzip-compressed), if one was generated before"""
+    return db.session.get(ExportBlob, offline_html_key(playlist, compress))
+
+
+def stream_offline_html(playlist: ViewerPlaylist, compress: bool = False) -> Iterator[bytes]:
+    """Stream the playlist's offline page and store the same bytes, compressed, for later downloads"""
+    compressor = ExportCompressor()
+    for piece in iter_offline_html(iter_entries(playlist.id), compress):
+        chunk = piece.encode('utf-8')
+        compressor.write(chunk)
+        yield chunk
+
+    # Only fully delivered pages are stored
+    _, data = compressor.finish()
+    store_blob(offline_html_key(playlist, compress), data, compressor.size)
+    db.session.commit()
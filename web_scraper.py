@@ -1,8 +1,11 @@
 import trafilatura
+import codecs
+import html
 import re
-import requests
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
 import logging
+from typing import Iterable, Iterator, List
+from http_client import shared_client
 
 def get_website_text_content(url: str) -> str:
     """
@@ -10,49 +13,133 @@ def get_website_text_content(url: str) -> str:
     The text content is extracted using trafilatura and easier to understand.
     """
     try:
-        # Send a request to the website
-        downloaded = trafilatura.fetch_url(url)
+        # Fetched over the shared connection pools rather than trafilatura's own fetcher
+        with shared_client().get(url, stream=True) as response:
+            response.raise_for_status()
+            downloaded = ''.join(_iter_text(response))
         text = trafilatura.extract(downloaded)
         return text
     except Exception as e:
         logging.error(f"Error extracting content from {url}: {e}")
         return ""
 
+# Playlist links are found by scanning for ".m3u" (which also matches ".m3u8")
+# and growing each hit out to the surrounding link delimiters, so a page is
+# read once no matter how many ways a link can be written. Inside a quoted
+# attribute value the link runs to the closing quote instead, since values
+# like "Lista (1).m3u" or "my list.m3u" may contain spaces.
+_M3U_MARKER_RE = re.compile(r'\.m3u', re.IGNORECASE)
+_LINK_REST_RE = re.compile(r'[^\s"\'<>]*')
+_LINK_DELIMITERS = ' \t\r\n\f"\'<>'
+_URL_START_RE = re.compile(r'https?://', re.IGNORECASE)
+# Attributes whose (relative) values are resolved against the page URL
+_ATTRIBUTE_RE = re.compile(r'(?:href|src|data-[\w-]+)\s*=\s*["\']?$', re.IGNORECASE)
+_QUOTED_ATTRIBUTE_RE = re.compile(r'(?:href|src|data-[\w-]+)\s*=\s*$', re.IGNORECASE)
+_UNQUOTED_ATTRIBUTE_RE = re.compile(r'(?:href|src|data-[\w-]+)=', re.IGNORECASE)
+# Longest link considered; also the overlap kept between streamed chunks
+MAX_LINK_CHARS = 2048
+_ATTRIBUTE_CONTEXT_CHARS = 64
+# Pages are streamed, but reading stops after this many bytes
+MAX_PAGE_BYTES = 32 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+def _quoted_attribute_value(text: str, window: int, position: int, marker_end: int):
+    """(start, end) of the quoted attribute value around a marker, or None"""
+    quote_at = max(text.rfind('"', window, position), text.rfind("'", window, position))
+    if quote_at < 0 or not _QUOTED_ATTRIBUTE_RE.search(
+            text, max(0, quote_at - _ATTRIBUTE_CONTEXT_CHARS), quote_at):
+        return None
+    close_at = text.find(text[quote_at], marker_end, marker_end + MAX_LINK_CHARS)
+    if close_at < 0:
+        return None
+    return quote_at + 1, close_at
+
+def _scan_m3u_links(text: str, start: int, stop: int, base_url: str) -> Iterator[str]:
+    """Yield the links around ".m3u" markers found in text[start:stop]"""
+    link_end = 0
+    # Markers that start before `stop` but end after it belong to this scan
+    for marker in _M3U_MARKER_RE.finditer(text, start, min(len(text), stop + len('.m3u') - 1)):
+        position = marker.start()
+        if position < link_end:
+            # Another marker inside the link just yielded
+            continue
+        window = max(0, position - MAX_LINK_CHARS)
+        
+        value = _quoted_attribute_value(text, window, position, marker.end())
+        if value:
+            link_end = value[1]
+            link = text[value[0]:link_end].strip()
+            if link[:8].lower().startswith(('http://', 'https://')):
+                yield html.unescape(link)
+            else:
+                yield urljoin(base_url, html.unescape(link))
+            continue
+        
+        begin = max(text.rfind(delimiter, window, position) for delimiter in _LINK_DELIMITERS) + 1
+        if begin == 0 and window > 0:
+            continue
+        link_end = _LINK_REST_RE.match(text, marker.end(), marker.end() + MAX_LINK_CHARS).end()
+        link = text[begin:link_end]
+        
+        unquoted = _UNQUOTED_ATTRIBUTE_RE.match(link)
+        if unquoted:
+            link = link[unquoted.end():]
+            begin += unquoted.end()
+        url_start = _URL_START_RE.search(link, 0, position - begin)
+        if url_start:
+            # A bare URL, possibly run together with text before it
+            yield html.unescape(link[url_start.start():])
+        elif unquoted or _ATTRIBUTE_RE.search(text, max(0, begin - _ATTRIBUTE_CONTEXT_CHARS), begin):
+            yield urljoin(base_url, html.unescape(link))
+
+def find_m3u_links(chunks: Iterable[str], base_url: str) -> List[str]:
+    """Find M3U/M3U8 links in a page given as text chunks, in page order without duplicates
+    
+    Covers href, src and data-* attribute values (resolved against
+    `base_url`) and bare http(s) URLs, in a single pass over the text. Only
+    the last MAX_LINK_CHARS of the previous chunk are kept, so memory use
+    doesn't grow with the page size.
+    """
+    links = {}
+    text = ''
+    # Markers before this offset in `text` have been scanned
+    resume = 0
+    for chunk in chunks:
+        text += chunk
+        # Markers this close to the end may belong to a link that continues
+        # in the next chunk; they are scanned once it has arrived
+        stop = len(text) - MAX_LINK_CHARS
+        if stop > resume:
+            links.update(dict.fromkeys(_scan_m3u_links(text, resume, stop, base_url)))
+            resume = stop
+        # Keep only what the next scan needs to look back at
+        keep = max(0, resume - MAX_LINK_CHARS - _ATTRIBUTE_CONTEXT_CHARS)
+        text = text[keep:]
+        resume -= keep
+    
+    links.update(dict.fromkeys(_scan_m3u_links(text, resume, len(text), base_url)))
+    return list(links)
+
+def _iter_text(response) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    received = 0
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_BYTES):
+        received += len(chunk)
+        yield decoder.decode(chunk)
+        if received >= MAX_PAGE_BYTES:
+            logging.warning(f"Stopped reading {response.url} after {MAX_PAGE_BYTES} bytes")
+            return
+    yield decoder.decode(b'', final=True)
+
 def search_m3u_links(url: str) -> list:
     """
     Search for M3U links on a webpage
     """
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        content = response.text
-        
-        # Parse base URL for relative links
-        parsed_url = urlparse(url)
-        base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-        
-        # Find M3U links
-        m3u_links = []
-        
-        # Pattern for M3U links
-        patterns = [
-            r'href=["\']([^"\']*\.m3u[^"\']*)["\']',
-            r'href=["\']([^"\']*\.m3u8[^"\']*)["\']',
-            r'(https?://[^\s<>"\']+\.m3u[^\s<>"\']*)',
-            r'(https?://[^\s<>"\']+\.m3u8[^\s<>"\']*)'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, content, re.IGNORECASE)
-            for match in matches:
-                # Convert relative URLs to absolute
-                if match.startswith('http'):
-                    m3u_links.append(match)
-                else:
-                    absolute_url = urljoin(url, match)
-                    m3u_links.append(absolute_url)
-        
-        return list(set(m3u_links))  # Remove duplicates
+        with shared_client().get(url, stream=True) as response:
+            response.raise_for_status()
+            # Relative links resolve against the final URL, after redirects
+            return find_m3u_links(_iter_text(response), response.url)
         
     except Exception as e:
         logging.error(f"Error searching M3U links on {url}: {e}")
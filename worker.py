@@ -0,0 +1,12 @@
+import os
+
+# This process is the worker; don't also start one inside the app import
+os.environ["JOB_WORKER_EMBEDDED"] = "0"
+
+from app import app
+from job_queue import start_worker_threads
+
+if __name__ == '__main__':
+    # One worker thread per lane, so quick jobs never wait behind a long search
+    for thread in start_worker_threads():
+        thread.join()